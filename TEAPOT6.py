@@ -1,7 +1,18 @@
 import pygame
-import random
 import sys
 import os
+import time
+import csv
+import hashlib
+import struct
+import zlib
+import heapq
+from collections import OrderedDict
+from itertools import islice
+from concurrent.futures import ThreadPoolExecutor
+
+from simulation import (AllocationTracker, COMPANY_COUNT, MIN_TURNS_TO_WIN, REGIONS, Simulation, StageTimer,
+                        TURN_STAGES, load_world)
 
 # --- Constants ---
 
@@ -13,6 +24,13 @@ BUTTON_ICONS = {
     "help": "help.png",
     "exit": "exit.png"
 }
+BUTTON_HOVER_TEXTS = {
+    "next_turn": "Следующий ход",
+    "view_market": "Рынок",
+    "win_progress": "Прогресс",
+    "help": "Справка",
+    "exit": "Выход"
+}
 
 # Button dimensions (square)
 BUTTON_SIZE_PCT = 0.09  # Increased from 0.06 to 0.09 (1.5x larger)
@@ -28,6 +46,7 @@ REGION_BUTTON_HEIGHT_PCT = 0.085  # Increased from 0.08 to 0.09
 REGION_BUTTON_TOP_MARGIN_PCT = 0.14
 REGION_BUTTON_LEFT_MARGIN_PCT = 0.0  # 2% from left
 REGION_ICON_SIZE_PCT = 0.08  # 8% of screen height (square)
+REGION_SCROLLBAR_WIDTH = 6  # Shown when the world has more regions than fit on screen
 
 # Resources window
 RESOURCES_HEIGHT_PCT = 0.14  # Reduced from default to 15% of screen height
@@ -45,12 +64,49 @@ GAME_LOG_MARGIN_PCT = -0.00  # 1% margin from edges
 
 # Region info window dimensions
 REGION_INFO_WIDTH_PCT = 0.25  # 25% of screen width
-REGION_INFO_HEIGHT_PCT = 0.6  # 60% of screen height
+REGION_INFO_HEIGHT_PCT = 0.7  # 70% of screen height
+
+# Region window and trade orders
+MAX_LISTED_COMPANIES = 3  # Competitors named in the region and progress windows (the leaders, if there are more)
+ORDER_QUANTITIES = {"workers": 1, "goods": 100}  # Default size of hire/fire and buy/sell orders
+MAX_ORDER_DIGITS = 7
 
 FONT_LARGE = 36
 FONT_MEDIUM = 24
 FONT_SMALL = 20
 
+# Game log
+GAME_LOG_HISTORY_PATH = os.path.join(os.path.dirname(__file__), "game_history.log")  # Full history of UI games
+
+# Save games
+QUICKSAVE_PATH = os.path.join(os.path.dirname(__file__), "quicksave.teas")
+
+# Images
+IMG_DIR = os.path.join(os.path.dirname(__file__), "img")
+ASSET_CACHE_DIR = os.path.join(os.path.dirname(__file__), ".asset_cache")  # Pre-scaled images
+ASSET_LOADER_THREADS = 4
+
+# Only redraw and present the panels that changed since the last frame
+DIRTY_RECT_RENDERING = True
+
+# Widgets: hover and clicks are resolved through a spatial hash of their rects
+WIDGET_CELL_SIZE = 64  # Pixels per hash cell
+
+# Main loop pacing
+MAX_FPS = 60  # Frame cap while something on screen is changing
+IDLE_MODE = True  # Sleep until input arrives while nothing is changing
+IDLE_WAIT_MS = 1000  # Longest sleep between two idle checks
+
+# Performance HUD (toggled with F3)
+PERF_HUD_REFRESH_MS = 500  # How often the numbers on the HUD change
+PERF_CSV_PATH = os.path.join(os.path.dirname(__file__), "perf_log.csv")  # One row per drawn frame while the HUD is on
+DRAW_STAGES = ("prepare", "background", "region_list", "resources", "game_log", "progress", "hover_text", "region", "modal", "game_over",
+               "perf_hud", "present")
+TRACK_ALLOCATIONS = bool(os.environ.get("TEA_TRACK_ALLOCATIONS"))  # Per-stage allocation report on exit (slow)
+
+# World definition: a JSON file of regions to play on instead of the built-in REGIONS
+WORLD_PATH = os.environ.get("TEA_WORLD")
+
 # Colors
 BLACK = (0, 0, 0)
 WHITE = (255, 255, 255)
@@ -60,213 +116,353 @@ RED = (200, 0, 0)
 BLUE = (0, 0, 200)
 YELLOW = (255, 255, 0)
 
-# Region Information
-REGIONS = {
-    "Индонезия": {"tea_leaves_cost": 5.0, "labor_cost": 250, "tax_rate": 0.1, "potential_tea": 500, "icon": "indonesia.png"},
-    "Индия": {"tea_leaves_cost": 6.0, "labor_cost": 300, "tax_rate": 0.12, "potential_tea": 600, "icon": "india.png"},
-    "Китай": {"tea_leaves_cost": 7.5, "labor_cost": 325, "tax_rate": 0.15, "potential_tea": 700, "icon": "china.png"},
-    "Турция": {"tea_leaves_cost": 6.5, "labor_cost": 310, "tax_rate": 0.13, "potential_tea": 550, "icon": "turkey.png"},
-    "Кения": {"tea_leaves_cost": 4.0, "labor_cost": 200, "tax_rate": 0.08, "potential_tea": 450, "icon": "kenya.png"},
-    "Германия": {"tea_leaves_cost": 10.0, "labor_cost": 400, "tax_rate": 0.20, "potential_tea": 800, "icon": "germany.png"},
-    "Россия": {"tea_leaves_cost": 8.5, "labor_cost": 380, "tax_rate": 0.17, "potential_tea": 750, "icon": "russia.png"},
-    "США": {"tea_leaves_cost": 12.5, "labor_cost": 450, "tax_rate": 0.25, "potential_tea": 700, "icon": "usa.png"},
-    "Аргентина": {"tea_leaves_cost": 5.5, "labor_cost": 275, "tax_rate": 0.11, "potential_tea": 650, "icon": "argentina.png"},
-    "Австралия": {"tea_leaves_cost": 9.0, "labor_cost": 425, "tax_rate": 0.18, "potential_tea": 850, "icon": "australia.png"},
-}
+# Price charts in the market window
+CHART_AXES = (("current_tea_price", "tea_leaves_cost"), ("labor_cost",))  # Region metrics sharing a y scale
+CHART_COLORS = {"current_tea_price": GREEN, "tea_leaves_cost": RED, "labor_cost": BLUE}
+CHART_LABELS = {"current_tea_price": "Чай", "tea_leaves_cost": "Сырье", "labor_cost": "Рабочие (своя шкала)"}
+CHART_SPANS = (10, 25, 50, 100, 250, 1000)  # Zoom levels: turns across one chart
+CHART_DEFAULT_SPAN = 50
+CHART_COLUMNS = 2
+CHART_HEIGHT_PCT = 0.1  # 10% of screen height
+CHART_RANGE_PADDING = 0.2  # Room above and below the values, so a new turn rarely rescales the chart
 
 # --- Classes ---
-class Player:
-    def __init__(self):
-        self.name = "Player"
-        self.money = 5000
-        self.tea_leaves = 0
-        self.processed_tea = 0
-        self.equipment_multiplier = 1.0
-        self.owned_tea_percentage = 0
-
-    def hire_worker(self, region):
-        if self.money >= region.labor_cost:
-            self.money -= region.labor_cost
-            region.update_worker_count(self.name, 1)
-            return True
-        return False
-
-    def fire_worker(self, region):
-        if region.get_worker_count(self.name) > 0:
-            region.update_worker_count(self.name, -1)
-            return True
-        return False
-
-    def get_total_tea(self):
-        return self.tea_leaves + self.processed_tea
+class AssetManager:
+    """Loads and scales images in a thread pool and keeps the scaled versions on disk.
+
+    Cached files are raw pixels named after the source file's hash and the
+    target size, so a changed image or a new resolution is simply a miss.
+    """
+    def __init__(self, img_dir=IMG_DIR, cache_dir=ASSET_CACHE_DIR, threads=ASSET_LOADER_THREADS):
+        self.img_dir = img_dir
+        self.cache_dir = cache_dir
+        self.threads = threads
+
+    def load_all(self, requests):
+        """Load {key: (file name, (width, height))}. Returns {key: Surface}, None for failures."""
+        with ThreadPoolExecutor(max_workers=self.threads) as pool:
+            futures = {key: pool.submit(self.load_scaled, file_name, size) for key, (file_name, size) in requests.items()}
+
+        images = {}
+        for key, future in futures.items():
+            try:
+                image = future.result()
+            except (pygame.error, OSError) as e:
+                print(f"Could not load image {requests[key][0]}: {e}")
+                images[key] = None
+                continue
+            # Convert to the display format once, instead of on every blit
+            images[key] = image.convert_alpha() if image.get_flags() & pygame.SRCALPHA else image.convert()
+        return images
+
+    def load_scaled(self, file_name, size):
+        size = (int(size[0]), int(size[1]))
+        path = os.path.join(self.img_dir, file_name)
+        with open(path, "rb") as f:
+            data = f.read()
+        digest = hashlib.sha1(data).hexdigest()[:16]
+
+        for pixel_format in ("RGBA", "RGB"):
+            cache_path = self.cache_path(file_name, digest, size, pixel_format)
+            try:
+                with open(cache_path, "rb") as f:
+                    return pygame.image.frombytes(f.read(), size, pixel_format)
+            except (OSError, ValueError, pygame.error):
+                continue
 
-class Company:
-    def __init__(self, name, money_multiplier=1.0, tea_multiplier=1.0):
-        self.name = name
-        # Increased starting resources based on multipliers
-        self.money = random.randint(5000, 15000) * money_multiplier
-        self.influence = {} # Region : Influence
-        self.tea_leaves = random.randint(100, 300) * tea_multiplier
-        self.processed_tea = random.randint(50, 150) * tea_multiplier
-        self.workers = {}  # region: number_of_workers
-        self.equipment_multiplier = random.uniform(1.2, 1.5)  # Companies start with better equipment
-        self.owned_tea_percentage = 0
-        self.aggressive_factor = random.uniform(1.5, 3.0)  # Companies are more aggressive in trading
-
-    def add_influence(self, region, amount):
-        if region not in self.influence:
-            self.influence[region] = 0
-        self.influence[region] = max(0, self.influence.get(region, 0) + amount)  # Ensure influence doesn't go below 0
-
-    def get_total_tea(self):
-        return self.processed_tea
-
-    def hire_worker(self, region):
-        """Hire a worker in the specified region."""
-        # Companies are willing to spend more on workers
-        if self.money >= region.labor_cost * 0.8:  # 20% discount on labor costs
-            self.money -= region.labor_cost
-            region.update_worker_count(self.name, 1)
-            return True
-        return False
+        image = pygame.image.load(path, file_name)
+        image = pygame.transform.scale(image, size)
+        self.store(image, file_name, digest, size)
+        return image
 
-    def fire_worker(self, region):
-        """Fire a worker in the specified region."""
-        if region.get_worker_count(self.name) > 0:
-            region.update_worker_count(self.name, -1)
-            return True
-        return False
+    def cache_path(self, file_name, digest, size, pixel_format):
+        name = os.path.splitext(file_name)[0]
+        return os.path.join(self.cache_dir, f"{name}-{digest}-{size[0]}x{size[1]}.{pixel_format.lower()}")
 
+    def store(self, image, file_name, digest, size):
+        pixel_format = "RGBA" if image.get_flags() & pygame.SRCALPHA else "RGB"
+        cache_path = self.cache_path(file_name, digest, size, pixel_format)
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            tmp_path = f"{cache_path}.{os.getpid()}.tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(pygame.image.tobytes(image, pixel_format))
+            os.replace(tmp_path, cache_path)
+        except OSError as e:
+            print(f"Could not cache image {file_name}: {e}")
+
+class TextCache:
+    """LRU cache of rendered text surfaces keyed by (font, text, color, antialias)."""
+    def __init__(self, max_size=512):
+        self.max_size = max_size
+        self.surfaces = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def render(self, font, text, color, antialias=True):
+        key = (font, text, color, antialias)
+        surface = self.surfaces.get(key)
+        if surface is not None:
+            self.surfaces.move_to_end(key)
+            self.hits += 1
+            return surface
+
+        self.misses += 1
+        surface = font.render(text, antialias, color)
+        self.surfaces[key] = surface
+        if len(self.surfaces) > self.max_size:
+            self.surfaces.popitem(last=False)  # Evict the least recently used text
+        return surface
 
-class Region:
-    def __init__(self, name, data):
+    def clear(self):
+        self.surfaces.clear()
+
+class HistoryChart:
+    """Line chart of one entity's history table values, cached on a surface.
+
+    The x axis covers `span` turns from `start`. A finished turn only adds its
+    segment to every line; the whole chart is redrawn when the turns run past
+    the right edge (the window then moves so the latest turn is in the middle)
+    or a value leaves the range of its axis. `axes` groups the metrics that
+    share a y scale.
+    """
+    def __init__(self, table, entity, axes, colors, size, span):
+        self.table = table
+        self.entity = entity
+        self.axes = axes
+        self.colors = colors
+        self.size = size
+        self.span = span
+        self.surface = None
+        self.start = None  # First turn on the x axis
+        self.turn = None  # Last turn drawn
+        self.ranges = []  # (low, high) of every axis
+        self.points = {}  # Metric : last point drawn of its line
+
+    def point(self, turn, value, axis):
+        width, height = self.size
+        low, high = self.ranges[axis]
+        return ((turn - self.start) * (width - 1) / max(1, self.span - 1),
+                (height - 1) * (high - value) / (high - low))
+
+    def update(self):
+        """Bring the chart up to the last recorded turn and return its surface."""
+        last = self.table.last_turn
+        if self.surface is None or last >= self.start + self.span:
+            self.rebuild()
+            return self.surface
+        if last == self.turn:
+            return self.surface
+
+        new_values = [[self.table.series(metric, self.entity, self.turn + 1, last + 1) for metric in axis]
+                      for axis in self.axes]
+        for (low, high), axis_values in zip(self.ranges, new_values):
+            if any(not low <= value <= high for values in axis_values for value in values):
+                self.rebuild()
+                return self.surface
+        for axis, (metrics, axis_values) in enumerate(zip(self.axes, new_values)):
+            for metric, values in zip(metrics, axis_values):
+                points = [self.points[metric]]
+                points.extend(self.point(turn, value, axis) for turn, value in enumerate(values, self.turn + 1))
+                pygame.draw.lines(self.surface, self.colors[metric], False, points)
+                self.points[metric] = points[-1]
+        self.turn = last
+        return self.surface
+
+    def rebuild(self):
+        """Redraw every line from the table, at most one (min, max) sample per pixel column."""
+        table = self.table
+        width, height = self.size
+        last = table.last_turn
+        self.start = table.first_turn if last < table.first_turn + self.span else last - self.span // 2
+        self.turn = last
+        if self.surface is None or self.surface.get_size() != self.size:
+            self.surface = pygame.Surface(self.size)
+        self.surface.fill(WHITE)
+
+        self.ranges = []
+        self.points = {}
+        for axis, metrics in enumerate(self.axes):
+            samples = {metric: table.downsample(metric, self.entity, width, self.start, last + 1) for metric in metrics}
+            lows = [low for metric_samples in samples.values() for _, low, _ in metric_samples]
+            highs = [high for metric_samples in samples.values() for _, _, high in metric_samples]
+            if not lows:
+                self.ranges.append((0.0, 1.0))
+                continue
+            low, high = min(lows), max(highs)
+            padding = (high - low) * CHART_RANGE_PADDING or abs(high) * CHART_RANGE_PADDING or 1.0
+            self.ranges.append((low - padding, high + padding))
+
+            for metric, metric_samples in samples.items():
+                points = []
+                for turn, low, high in metric_samples:
+                    points.append(self.point(turn, low, axis))
+                    if high != low:
+                        points.append(self.point(turn, high, axis))
+                if len(points) > 1:
+                    pygame.draw.lines(self.surface, self.colors[metric], False, points)
+                self.points[metric] = self.point(last, table.series(metric, self.entity, last, last + 1)[0], axis)
+
+class SpatialHash:
+    """Grid of square cells, each listing the items whose rects touch it, for point lookups
+    that only look at the items in one cell however many items there are."""
+    def __init__(self, cell_size=WIDGET_CELL_SIZE):
+        self.cell_size = cell_size
+        self.cells = {}  # (column, row) : list of items
+        self.item_cells = {}  # id(item) : cells the item is listed in
+
+    def cells_of(self, rect):
+        size = self.cell_size
+        return [(column, row)
+                for column in range(rect.left // size, (rect.right - 1) // size + 1)
+                for row in range(rect.top // size, (rect.bottom - 1) // size + 1)]
+
+    def insert(self, item, rect):
+        self.remove(item)
+        if rect.width <= 0 or rect.height <= 0:
+            return
+        cells = self.cells_of(rect)
+        for cell in cells:
+            self.cells.setdefault(cell, []).append(item)
+        self.item_cells[id(item)] = cells
+
+    def remove(self, item):
+        for cell in self.item_cells.pop(id(item), ()):
+            items = self.cells[cell]
+            items.remove(item)
+            if not items:
+                del self.cells[cell]
+
+    def query(self, pos):
+        """Items whose cell contains pos; they may still miss it within the cell."""
+        return self.cells.get((pos[0] // self.cell_size, pos[1] // self.cell_size), ())
+
+    def clear(self):
+        self.cells.clear()
+        self.item_cells.clear()
+
+class Widget:
+    """A rect on screen that can be hovered, clicked and drawn from a cached surface.
+
+    A widget takes input only while `active()` (and its parent's) returns True.
+    `render(widget)` returns its surface, which is kept until `state()` or
+    the widget's size changes.
+    """
+    def __init__(self, name, rect, on_click=None, hover_text=None, layer=0, active=None, parent=None,
+                 render=None, state=None, closes_modal=True):
         self.name = name
-        self.base_tea_leaves_cost = data["tea_leaves_cost"]
-        self.base_labor_cost = data["labor_cost"]
-        self.tax_rate = data["tax_rate"]
-        self.potential_tea = data["potential_tea"]
-        self.workers = {}  # company/player name : # workers
-        self.current_tea_price = 7  # Initial price
-        
-        # Economic factors
-        self.economic_stability = random.uniform(0.5, 1.5)  # Economic stability multiplier
-        self.labor_market_pressure = random.uniform(0.5, 1.5)  # Labor market pressure
-        self.agricultural_conditions = random.uniform(0.8, 1.2)  # Agricultural conditions
-        self.market_development = random.uniform(0.8, 1.2)  # Market development level
-        
-        # Current costs (will be updated each turn)
-        self.tea_leaves_cost = self.base_tea_leaves_cost * random.uniform(0.8, 1.2)
-        self.labor_cost = self.base_labor_cost * random.uniform(0.8, 1.2)
-        
-        # Price ranges based on region's economic factors
-        self.min_price = self.tea_leaves_cost * 5  # Minimum price is 5x the tea leaves cost
-        self.max_price = self.tea_leaves_cost * 15  # Maximum price is 15x the tea leaves cost
-        
-    def update_economic_factors(self):
-        """Update economic factors each turn."""
-        # Randomly adjust economic factors with small variations
-        self.economic_stability *= random.uniform(0.95, 1.05)  # ±5% change
-        self.labor_market_pressure *= random.uniform(0.93, 1.07)  # ±7% change
-        self.agricultural_conditions *= random.uniform(0.9, 1.1)  # ±10% change
-        self.market_development *= random.uniform(0.95, 1.05)  # ±5% change
-        
-        # Keep factors within reasonable bounds
-        self.economic_stability = max(0.6, min(1.4, self.economic_stability))
-        self.labor_market_pressure = max(0.7, min(1.3, self.labor_market_pressure))
-        self.agricultural_conditions = max(0.5, min(1.5, self.agricultural_conditions))
-        self.market_development = max(0.8, min(1.2, self.market_development))
-        
-        # Update costs based on economic factors
-        self.update_costs()
-        
-    def update_costs(self):
-        """Update tea leaves and labor costs based on economic factors."""
-        # Tea leaves cost affected by agricultural conditions and economic stability
-        tea_leaves_multiplier = (self.agricultural_conditions * 0.7 + self.economic_stability * 0.3)
-        self.tea_leaves_cost = self.base_tea_leaves_cost * tea_leaves_multiplier
-        
-        # Labor cost affected by labor market pressure and economic stability
-        labor_multiplier = (self.labor_market_pressure * 0.6 + self.economic_stability * 0.4)
-        self.labor_cost = int(self.base_labor_cost * labor_multiplier)
-        
-        # Update price ranges
-        self.min_price = self.tea_leaves_cost * 5
-        self.max_price = self.tea_leaves_cost * 15
-        
-    def randomize_price(self):
-        """Randomize the tea price within region-specific range."""
-        # Base random price
-        base_random = random.uniform(self.min_price, self.max_price)
-        
-        # Apply economic factors
-        economic_modifier = (
-            self.economic_stability * 0.3 +  # 30% influence from economic stability
-            self.market_development * 0.4 +  # 40% influence from market development
-            self.agricultural_conditions * 0.3  # 30% influence from agricultural conditions
-        ) / 3  # Normalize to a reasonable range
-        
-        # Add some market volatility (±20%)
-        volatility = random.uniform(-0.2, 0.2)
-        
-        # Calculate final price
-        final_price = base_random * economic_modifier * (1 + volatility)
-        
-        # Ensure price stays within bounds
-        self.current_tea_price = max(self.min_price, min(self.max_price, final_price))
-        return self.current_tea_price
-
-    def get_worker_count(self, company_name):
-        return self.workers.get(company_name, 0)
-
-    def update_worker_count(self, company_name, count):
-        if company_name not in self.workers:
-             self.workers[company_name] = 0
-        self.workers[company_name] += count
-
-    def get_current_tea_price(self):
-        return self.current_tea_price
-
-    def harvest_tea(self, company, equipment_multiplier):
-        """Calculate the amount of raw tea harvested."""
-        worker_count = self.get_worker_count(company.name)
-        if worker_count is None or worker_count <= 0:
-            return 0
-
-        base_output = worker_count * 100  # Base output per harvester
-        return int(base_output * equipment_multiplier)  # Adjust by equipment multiplier
-
-    def pack_tea(self, company, raw_tea, equipment_multiplier):
-        """Calculate the amount of packed tea produced."""
-        worker_count = self.get_worker_count(company.name)
-        if worker_count is None or worker_count <= 0:
-            return 0
-
-        base_output = worker_count * 75  # Base output per packer
-        packed_tea = min(raw_tea, int(base_output * equipment_multiplier))  # Limit to available raw tea
-        return packed_tea
+        self.rect = pygame.Rect(rect)
+        self.on_click = on_click  # Called with the MOUSEBUTTONDOWN event
+        self.hover_text = hover_text
+        self.layer = layer  # Higher layers are on top
+        self.active = active
+        self.parent = parent
+        self.render = render
+        self.state = state
+        self.closes_modal = closes_modal  # Whether a click on it also closes the open popup
+        self.order = 0  # Set by the tree; later widgets are on top within a layer
+        self.surface = None
+        self.surface_key = None
+
+    def is_active(self):
+        widget = self
+        while widget is not None:
+            if widget.active is not None and not widget.active():
+                return False
+            widget = widget.parent
+        return True
+
+    def draw(self, surface):
+        key = (self.rect.size, self.state() if self.state else None)
+        if self.surface is None or key != self.surface_key:
+            self.surface = self.render(self)
+            self.surface_key = key
+        surface.blit(self.surface, self.rect)
+
+class WidgetTree:
+    """All widgets by name, with their rects in a spatial hash for hover and click lookups."""
+    def __init__(self, cell_size=WIDGET_CELL_SIZE):
+        self.widgets = {}
+        self.index = SpatialHash(cell_size)
+        self.added = 0
+
+    def add(self, widget):
+        old = self.widgets.get(widget.name)
+        if old is not None:
+            self.index.remove(old)
+        self.added += 1
+        widget.order = self.added
+        self.widgets[widget.name] = widget
+        self.index.insert(widget, widget.rect)
+        return widget
+
+    def __getitem__(self, name):
+        return self.widgets[name]
+
+    def widget_at(self, pos):
+        """The topmost active widget under pos, or None."""
+        best = None
+        for widget in self.index.query(pos):
+            if (widget.rect.collidepoint(pos) and (best is None or (widget.layer, widget.order) > (best.layer, best.order))
+                    and widget.is_active()):
+                best = widget
+        return best
+
+    def clear(self):
+        self.widgets.clear()
+        self.index.clear()
 
 class Game:
-    def __init__(self):
+    def __init__(self, seed=None, screen_size=None, log_path=GAME_LOG_HISTORY_PATH, company_count=COMPANY_COUNT,
+                 world=REGIONS):
         pygame.init()
         
-        # Get the display info and set up fullscreen
-        display_info = pygame.display.Info()
-        self.screen_width = display_info.current_w
-        self.screen_height = display_info.current_h
+        # Get the display info and set up fullscreen (or a window of screen_size, e.g. for benchmarks)
+        if screen_size is None:
+            display_info = pygame.display.Info()
+            screen_size = (display_info.current_w, display_info.current_h)
+            flags = pygame.FULLSCREEN
+        else:
+            flags = 0
+        self.screen_width, self.screen_height = screen_size
         
-        self.active_input_box = None  # Track which input box is active
-        self.screen = pygame.display.set_mode((self.screen_width, self.screen_height), pygame.FULLSCREEN)
+        # Region window order sizes and the one being typed in, if any
+        self.order_quantities = dict(ORDER_QUANTITIES)
+        self.editing_quantity = None
+        self.quantity_text = ""
+        self.screen = pygame.display.set_mode((self.screen_width, self.screen_height), flags)
         pygame.display.set_caption("Tea Empire")
         self.clock = pygame.time.Clock()
         
-        # Load background image
-        try:
-            bg_path = os.path.join(os.path.dirname(__file__), "img", "background.jpg")
-            self.background = pygame.image.load(bg_path)
-            self.background = pygame.transform.scale(self.background, (self.screen_width*1.041, self.screen_height*1.041))
-        except:
-            print("Could not load background image")
-            self.background = None
+        # Regions of the world being played, in list order
+        self.world = world
+        self.region_names = list(world)
+        self.region_scroll = 0  # Index of the topmost row shown in the region list
+        self.region_list_layer = None  # Visible rows over their piece of background, rebuilt on scroll
+        self.region_list_state = None
+        self.region_icons = {}  # Region name : scaled icon, loaded when its row first becomes visible
+
+        # Market window: the table or the price charts of the regions from chart_first on
+        self.market_view = "table"
+        self.chart_span = CHART_DEFAULT_SPAN
+        self.chart_first = 0
+        self.market_charts = {}  # Region name : HistoryChart, only for the regions on screen
+        self.market_charts_key = None  # Chart size, span and history table the cached charts belong to
+
+        # Load the background, the buttons and the icons of the first visible regions at once,
+        # already scaled for this screen
+        button_size = int(BUTTON_SIZE_PCT * self.screen_height)
+        image_requests = {("background", None): ("background.jpg", (self.screen_width*1.041, self.screen_height*1.041))}
+        for button_name, icon_file in BUTTON_ICONS.items():
+            image_requests[("button", button_name)] = (icon_file, (button_size, button_size))
+        image_requests.update(self.region_icon_requests(self.region_names[:self.region_list_layout()[2]]))
+        self.assets = AssetManager()
+        images = self.assets.load_all(image_requests)
+        for (kind, region_name), image in images.items():
+            if kind == "region":
+                self.region_icons[region_name] = image
+
+        self.background = images[("background", None)]
 
         # Initialize different font sizes
         self.font_large = pygame.font.Font(None, FONT_LARGE)
@@ -275,36 +471,50 @@ class Game:
         
         # Default font is medium size
         self.font = self.font_medium
+        self.fonts_by_size = {}
+
+        # Rendered text is reused until it changes or gets evicted
+        self.text_cache = TextCache()
+
+        # Main loop pacing
+        self.max_fps = MAX_FPS
+        self.idle_mode = IDLE_MODE
+
+        # Static UI layer, composed on first draw and after every resize
+        self.static_layer = None
+        self.panel_surfaces = {}
+
+        # Dirty-rect rendering: what was on screen after the last presented frame
+        self.dirty_rect_rendering = DIRTY_RECT_RENDERING
+        self.full_redraw_needed = True
+        self.last_screen_state = None
+        self.last_panel_states = {}
+
+        # Performance HUD: stage timings of the frame being drawn and what the HUD currently shows
+        self.draw_timer = StageTimer("draw.")
+        self.perf_hud = False
+        self.perf_csv = None
+        self.perf_csv_writer = None
+        self.perf_stats = None  # (fps, frame ms, draw stage ms, turn stage ms, turn)
+        self.perf_frames = 0  # Frames drawn since perf_window_start
+        self.perf_window_start = time.perf_counter()
+        self.last_frame_ms = 0.0
+        self.last_draw_timings = {}
 
         self.running = True
         self.current_region = None
-        self.player = Player()
-        # Create more aggressive competitor companies with higher starting resources
-        self.companies = [
-            Company(f"Компания {i+1}", 
-                   money_multiplier=random.uniform(2.0, 3.0),  # 2-3x more starting money
-                   tea_multiplier=random.uniform(1.5, 2.0)     # 1.5-2x more starting tea
-            ) for i in range(3)
-        ]
-        
-        self.regions = {name: Region(name, data) for name, data in REGIONS.items()}
-        self.messages = []
-        self.market_demand = 100000
-        self.global_tea_supply = 0
-        self.global_tea_demand = 0
-
-        # Load button icons
-        self.button_icons = {}
-        img_dir = os.path.join(os.path.dirname(__file__), "img")
-        for button_name, icon_file in BUTTON_ICONS.items():
-            try:
-                icon_path = os.path.join(img_dir, icon_file)
-                icon = pygame.image.load(icon_path)
-                button_size = int(BUTTON_SIZE_PCT * self.screen_height)
-                self.button_icons[button_name] = pygame.transform.scale(icon, (button_size, button_size))
-            except:
-                print(f"Could not load icon for {button_name}")
-                self.button_icons[button_name] = None
+        self.log_path = log_path
+        self.sim = Simulation(log_path=log_path, seed=seed, regions=world, company_count=company_count)
+
+        # Opt-in allocation statistics per draw and turn stage, reported on exit
+        self.allocation_tracker = None
+        if TRACK_ALLOCATIONS:
+            self.allocation_tracker = AllocationTracker()
+            self.draw_timer.allocations = self.allocation_tracker
+            self.sim.turn_timer.allocations = self.allocation_tracker
+
+        # Button icons
+        self.button_icons = {button_name: images[("button", button_name)] for button_name in BUTTON_ICONS}
 
         # Initialize UI elements with percentage-based positions
         button_size = int(BUTTON_SIZE_PCT * self.screen_height)
@@ -322,18 +532,9 @@ class Game:
         # Store button hover state
         self.hovered_button = None
 
-        self.game_over = False
-        self.winner = None
-        self.target_money = 500000  # Increased from 100,000 to 300,000
-        self.monopoly_threshold = 0.6  # 60% market share requirement
-        self.turn_count = 0  # Track number of turns played
-
-        # Set up initial market prices
-        self.update_market_prices()
-
-        # Flags to show popup windows
-        self.showing_help = True
-        self.showing_win_conditions = False
+        # Popup window drawn over the game: None, "help", "progress" or "market".
+        # The game over screen is shown on top of it whenever the game is over.
+        self.modal = "help"
 
         # Help text placeholder
         self.help_text_lines = [
@@ -348,41 +549,13 @@ class Game:
             "",
             "Критерии победы:",
             "- Достаточно достигнуть одного из них:",
-            f"  ${self.target_money:,} или Контроль над {int(self.monopoly_threshold * 100)}% рынка",
-            "- Победа возможна после 7 ходов при условии,",
+            f"  ${self.sim.target_money:,} или Контроль над {int(self.sim.monopoly_threshold * 100)}% рынка",
+            f"- Победа возможна после {MIN_TURNS_TO_WIN} ходов при условии,",
             " что общее предложение больше общего спроса",
             "",
             "Нажмите, чтобы закрыть"
         ]
 
-        # Load region icons
-        self.region_icons = {}
-        img_dir = os.path.join(os.path.dirname(__file__), "img")
-        for region_name, region_data in REGIONS.items():
-            icon_path = os.path.join(img_dir, region_data["icon"])
-            try:
-                icon = pygame.image.load(icon_path)
-                icon_size = int(REGION_ICON_SIZE_PCT * self.screen_height)
-                self.region_icons[region_name] = pygame.transform.scale(icon, (icon_size, icon_size))
-            except:
-                print(f"Could not load icon for {region_name}")
-                self.region_icons[region_name] = None
-
-        # Calculate region button positions
-        self.region_buttons = {}
-        button_height = self.screen_height * REGION_BUTTON_HEIGHT_PCT
-        total_buttons = len(REGIONS)
-        start_y = self.screen_height * REGION_BUTTON_TOP_MARGIN_PCT
-        
-        for i, region_name in enumerate(REGIONS.keys()):
-            y_pos = start_y + (i * button_height)
-            self.region_buttons[region_name] = pygame.Rect(
-                self.screen_width * REGION_BUTTON_LEFT_MARGIN_PCT,
-                y_pos,
-                self.screen_width * REGION_BUTTON_WIDTH_PCT,
-                button_height
-            )
-
         # Progress window position
         self.progress_rect = pygame.Rect(
             self.screen_width * (1 - PROGRESS_WIDTH_PCT - PROGRESS_RIGHT_MARGIN_PCT),
@@ -393,11 +566,11 @@ class Game:
 
         # Initialize current region index for keyboard navigation
         self.current_region_index = 0
-        self.region_names = list(REGIONS.keys())
 
         # Game log properties
         self.message_scroll_offset = 0  # How many messages to skip from bottom
         self.max_visible_messages = 10  # Maximum number of visible messages
+        self.log_line_surfaces = {}  # Log sequence number : rendered line
         self.game_log_rect = pygame.Rect(
             self.screen_width * (1 - GAME_LOG_WIDTH_PCT - GAME_LOG_MARGIN_PCT),  # X position
             self.screen_height * (1 - GAME_LOG_HEIGHT_PCT - GAME_LOG_MARGIN_PCT),  # Y position
@@ -417,89 +590,44 @@ class Game:
             25   # Height
         )
 
-    def check_win_condition(self):
-        """Check if victory conditions are met."""
-        # Must meet EITHER conditions to win
-        money_condition = self.player.money >= self.target_money
-        
-        # Calculate market share
-        total_tea = self.player.get_total_tea()
-        for company in self.companies:
-            total_tea += company.get_total_tea()
+        # Everything that can be hovered or clicked
+        self.widgets = WidgetTree()
+        self.build_widgets()
 
-        if total_tea > 0: # only calculate if tea exists
-            self.player.owned_tea_percentage = self.player.get_total_tea() / total_tea
-            for company in self.companies:
-                company.owned_tea_percentage = company.get_total_tea() / total_tea
-
-            market_share_condition = self.player.owned_tea_percentage >= self.monopoly_threshold
-            
-            # Only win if BOTH conditions are met and at least 3 turns have passed
-            if self.turn_count >= 7:
-                if money_condition or market_share_condition:
-                    self.game_over = True
-                    self.winner = self.player.name
-
-        return self.game_over
-
-    def check_lose_condition(self):
-        if self.player.money <= 0:
-            self.game_over = True
-            self.winner = "Оставшиеся" # loose by money
-
-        # check if competitor wins
-        for company in self.companies:
-            if company.money >= self.target_money or company.owned_tea_percentage >= self.monopoly_threshold:
-                self.game_over = True
-                self.winner = company.name # loose by competitor
-        return self.game_over
-
-    def update_market_prices(self):
-        # Calculate total supply and demand
-        total_supply = self.player.get_total_tea()
-        for company in self.companies:
-            total_supply += company.get_total_tea()
-        self.global_tea_supply = total_supply
-
-        if total_supply == 0:
-            self.global_tea_supply = 1  # avoid division by zero
-            self.global_tea_demand = self.market_demand  # initial demand
-        else:
-            self.global_tea_demand = self.market_demand
-
-        # Calculate global market pressure (affects volatility)
-        market_pressure = self.global_tea_demand / self.global_tea_supply if self.global_tea_supply > 0 else 2.0
-        
-        # Update each region's price independently
-        for region in self.regions.values():
-            # Randomize base price
-            base_price = region.randomize_price()
-            
-            # Apply market pressure (±30% effect)
-            pressure_effect = (market_pressure - 1.0) * 0.3
-            final_price = base_price * (1 + pressure_effect)
-            
-            # Ensure price stays within region's bounds
-            region.current_tea_price = max(region.min_price, min(region.max_price, final_price))
-            
-        # Add message about price changes
-        #self.add_message("Tea prices have been updated in all regions!")
-
-    def handle_events(self):
-        for event in pygame.event.get():
+    def handle_events(self, events=None):
+        if events is None:
+            events = pygame.event.get()
+        for event in events:
             if event.type == pygame.QUIT:
                 self.running = False
+            elif event.type in (pygame.KEYDOWN, pygame.MOUSEBUTTONDOWN) and (self.sim.game_over or self.modal == "market"):
+                # The game over screen closes on any key or click, the market window on any it does not use
+                if self.sim.game_over:
+                    self.running = False
+                elif not self.handle_market_input(event):
+                    self.modal = None
+                continue
+            elif event.type == pygame.KEYDOWN and self.editing_quantity:
+                self.edit_quantity(event)
+                continue
+            elif event.type == pygame.VIDEOEXPOSE:
+                # The window was uncovered, its contents may be gone
+                self.full_redraw_needed = True
             elif event.type == pygame.KEYDOWN:
                 if event.key == pygame.K_ESCAPE:
                     self.running = False  # Exit on ESC
                 elif event.key == pygame.K_UP:
                     # Navigate to previous region
-                    self.current_region_index = (self.current_region_index - 1) % len(self.region_names)
-                    self.current_region = self.region_names[self.current_region_index]
+                    self.select_region((self.current_region_index - 1) % len(self.region_names))
                 elif event.key == pygame.K_DOWN:
                     # Navigate to next region
-                    self.current_region_index = (self.current_region_index + 1) % len(self.region_names)
-                    self.current_region = self.region_names[self.current_region_index]
+                    self.select_region((self.current_region_index + 1) % len(self.region_names))
+                elif event.key == pygame.K_F5:
+                    self.quicksave()
+                elif event.key == pygame.K_F9:
+                    self.quickload()
+                elif event.key == pygame.K_F3:
+                    self.toggle_perf_hud()
             elif event.type == pygame.VIDEORESIZE:
                 if not (self.screen.get_flags() & pygame.FULLSCREEN):
                     self.screen = pygame.display.set_mode((event.w, event.h), pygame.RESIZABLE)
@@ -508,64 +636,114 @@ class Game:
                     self.update_ui_elements()
 
             if event.type == pygame.MOUSEBUTTONDOWN:
-                mouse_pos = event.pos
-                
-                # Handle game log scrolling
-                if len(self.messages) > self.max_visible_messages:
-                    if self.scroll_up_rect.collidepoint(mouse_pos):
-                        if self.message_scroll_offset < len(self.messages) - self.max_visible_messages:
-                            self.message_scroll_offset += 1
-                    elif self.scroll_down_rect.collidepoint(mouse_pos):
-                        if self.message_scroll_offset > 0:
-                            self.message_scroll_offset -= 1
-                    elif self.game_log_rect.collidepoint(mouse_pos):
-                        # Scroll with mouse wheel in log area
-                        if event.button == 4:  # Mouse wheel up
-                            if self.message_scroll_offset < len(self.messages) - self.max_visible_messages:
-                                self.message_scroll_offset += 1
-                        elif event.button == 5:  # Mouse wheel down
-                            if self.message_scroll_offset > 0:
-                                self.message_scroll_offset -= 1
-                
-                # Handle region clicks
-                self.handle_region_clicks(mouse_pos)
-                
-                # Handle button clicks
-                if self.next_turn_button_rect.collidepoint(mouse_pos):
-                    self.next_turn()
-                elif self.exit_button_rect.collidepoint(mouse_pos):
-                    self.running = False
-                elif self.view_market_button_rect.collidepoint(mouse_pos):
-                    self.show_market_information()
-                elif self.help_button_rect.collidepoint(mouse_pos):
-                    self.showing_help = True
-                elif self.win_conditions_button_rect.collidepoint(mouse_pos):
-                    self.showing_win_conditions = True
-                # Handle other clicks
-                elif self.showing_help:
-                    self.showing_help = False
-                elif self.showing_win_conditions:
-                    self.showing_win_conditions = False
-                else:
-                    self.handle_region_clicks(mouse_pos)
-
-                # Check if input box is clicked
-                if self.active_input_box and self.active_input_box.collidepoint(mouse_pos):
-                    self.active_input_box = self.active_input_box  # Keep it active
-                else:
-                    self.active_input_box = None  # Deactivate if clicked outside
-
-            # Handle keyboard events for the input box
-            if self.active_input_box and event.type == pygame.KEYDOWN:
-                if event.key == pygame.K_RETURN:
-                    self.active_input_box = None  # Deactivate on enter
-                elif event.key == pygame.K_BACKSPACE:
-                    # Logic to remove last character from input
-                    if self.current_region:
-                        self.regions[self.current_region].bribes = self.regions[self.current_region].bribes // 10  # Simple way to remove last digit
-                elif event.unicode.isdigit():  # Only numbers
-                    if self.current_region:
-                        self.regions[self.current_region].bribes = self.regions[self.current_region].bribes * 10 + int(event.unicode)  # Update bribe amount
+                if self.editing_quantity:
+                    self.finish_quantity_edit()
+
+                # One lookup finds the widget under the cursor, and the widget handles the click
+                widget = self.widgets.widget_at(event.pos)
+                if widget is not None and widget.on_click:
+                    widget.on_click(event)
+                # Any other click closes the help or progress popup
+                if self.modal and (widget is None or widget.closes_modal):
+                    self.modal = None
+
+    def build_widgets(self):
+        """Register everything clickable at its current rect. Called again whenever the layout changes."""
+        self.widgets.clear()
+        add = self.widgets.add
+
+        # Toolbar: works over the help and progress popups without closing them
+        toolbar = (
+            ("next_turn", self.next_turn_button_rect, self.next_turn),
+            ("view_market", self.view_market_button_rect, lambda: self.show_modal("market")),
+            ("win_progress", self.win_conditions_button_rect, lambda: self.show_modal("progress")),
+            ("help", self.help_button_rect, lambda: self.show_modal("help")),
+            ("exit", self.exit_button_rect, self.quit),
+        )
+        for button_name, rect, action in toolbar:
+            add(Widget(button_name, rect, on_click=lambda event, action=action: action(),
+                       hover_text=BUTTON_HOVER_TEXTS[button_name], layer=1, closes_modal=False))
+
+        add(Widget("region_list", self.region_list_layout()[0], layer=1,
+                   on_click=lambda event: self.handle_region_clicks(event.pos, event.button)))
+
+        # Game log: the wheel scrolls it, and so do the arrow buttons once it overflows
+        game_log = add(Widget("game_log", self.game_log_rect, on_click=self.handle_game_log_wheel, layer=1,
+                              active=lambda: len(self.sim.log) > self.max_visible_messages))
+        add(Widget("scroll_up", self.scroll_up_rect, on_click=lambda event: self.scroll_game_log(1), layer=2,
+                   parent=game_log, render=lambda widget: self.render_scroll_button(widget, "↑"),
+                   state=lambda: self.message_scroll_offset < len(self.sim.log) - self.max_visible_messages))
+        add(Widget("scroll_down", self.scroll_down_rect, on_click=lambda event: self.scroll_game_log(-1), layer=2,
+                   parent=game_log, render=lambda widget: self.render_scroll_button(widget, "↓"),
+                   state=lambda: self.message_scroll_offset > 0))
+
+        # Region window: takes every click on it while a region is open and nothing is shown on top
+        (window_rect, hire_button_rect, fire_button_rect, buy_leaves_button_rect, sell_tea_button_rect,
+         workers_box_rect, goods_box_rect) = self.region_window_layout()
+        region_window = add(Widget("region_window", window_rect, layer=3,
+                                   active=lambda: self.current_region and not self.modal and not self.sim.game_over))
+        order_buttons = (("hire", hire_button_rect, "Hire Worker"), ("fire", fire_button_rect, "Fire Worker"),
+                         ("buy", buy_leaves_button_rect, "Купить сырье"), ("sell", sell_tea_button_rect, "Продать чай"))
+        for action, rect, label in order_buttons:
+            add(Widget(f"order_{action}", rect, on_click=lambda event, action=action: self.click_order_button(event, action),
+                       layer=4, parent=region_window, render=lambda widget, label=label: self.render_order_button(widget, label)))
+        for key, rect, label in (("workers", workers_box_rect, "Рабочие"), ("goods", goods_box_rect, "Товар")):
+            add(Widget(f"quantity_{key}", rect, on_click=lambda event, key=key: self.click_quantity_box(event, key),
+                       layer=4, parent=region_window,
+                       render=lambda widget, key=key, label=label: self.render_quantity_box(widget, key, label),
+                       state=lambda key=key: (self.order_quantities[key], self.editing_quantity == key, self.quantity_text)))
+
+    def show_modal(self, modal):
+        self.modal = modal
+
+    def quit(self):
+        self.running = False
+
+    def handle_game_log_wheel(self, event):
+        if event.button == 4:  # Mouse wheel up
+            self.scroll_game_log(1)
+        elif event.button == 5:  # Mouse wheel down
+            self.scroll_game_log(-1)
+
+    def scroll_game_log(self, messages):
+        """Scroll towards older (positive) or newer (negative) messages, within the log."""
+        self.message_scroll_offset = max(0, min(self.message_scroll_offset + messages,
+                                                len(self.sim.log) - self.max_visible_messages))
+
+    def quicksave(self):
+        try:
+            self.sim.save(QUICKSAVE_PATH)
+            self.sim.add_message("Игра сохранена (F9 - загрузить)")
+        except (OSError, ValueError, TypeError) as e:
+            print(f"Could not save game: {e}")
+            self.sim.add_message("Не удалось сохранить игру")
+
+    def quickload(self):
+        try:
+            sim = Simulation.load(QUICKSAVE_PATH, log_path=self.log_path)
+        except (OSError, ValueError, struct.error, zlib.error) as e:
+            print(f"Could not load game: {e}")
+            self.sim.add_message("Не удалось загрузить игру")
+            return
+        self.sim.log.close()
+        self.sim = sim
+        self.sim.turn_timer.allocations = self.allocation_tracker
+        self.sim.add_message("Игра загружена")
+        self.message_scroll_offset = 0
+        self.log_line_surfaces.clear()
+        # The save may be of another world
+        if list(self.sim.regions) != self.region_names:
+            # Saves only keep region names: icons come from this world or the stock one
+            self.world = {name: self.world.get(name) or REGIONS.get(name, {}) for name in self.sim.regions}
+            self.region_names = list(self.world)
+            self.region_icons.clear()
+            self.region_scroll = 0
+            self.chart_first = 0
+            self.current_region = None
+            self.current_region_index = 0
+            self.region_list_layer = None
+            self.build_widgets()  # The region list may have another height
+        self.full_redraw_needed = True
 
     def update_ui_elements(self):
         """Update all UI elements based on current screen dimensions"""
@@ -584,101 +762,277 @@ class Game:
         # Update font size
         self.font = self.font_medium
 
-    def handle_region_clicks(self, mouse_pos):
-        for i, (region_name, button_rect) in enumerate(self.region_buttons.items()):
-            if button_rect.collidepoint(mouse_pos):
-                self.current_region = region_name
-                self.current_region_index = i
-                break
+        # Everything pre-composed for the old size has to be rebuilt
+        self.static_layer = None
+        self.region_list_layer = None
+        self.panel_surfaces.clear()
+        self.scroll_region_list(0)  # More or fewer rows may fit now
+        self.build_widgets()
+
+    def region_list_layout(self):
+        """Rect of the region list, its row height and how many rows fit on screen."""
+        row_height = self.screen_height * REGION_BUTTON_HEIGHT_PCT
+        top = self.screen_height * REGION_BUTTON_TOP_MARGIN_PCT
+        visible_rows = max(1, int((self.screen_height - top) // row_height))
+        rows = min(visible_rows, len(self.region_names))
+        list_rect = pygame.Rect(self.screen_width * REGION_BUTTON_LEFT_MARGIN_PCT, top,
+                                self.screen_width * REGION_BUTTON_WIDTH_PCT, rows * row_height)
+        return list_rect, row_height, visible_rows
+
+    def region_row_rect(self, index):
+        """Button rect of the region at `index` in the list, where it is with the current scroll."""
+        row_height = self.screen_height * REGION_BUTTON_HEIGHT_PCT
+        return pygame.Rect(
+            self.screen_width * REGION_BUTTON_LEFT_MARGIN_PCT,
+            self.screen_height * REGION_BUTTON_TOP_MARGIN_PCT + (index - self.region_scroll) * row_height,
+            self.screen_width * REGION_BUTTON_WIDTH_PCT,
+            row_height
+        )
 
-    def draw(self):
-        # Draw background
-        if self.background:
-            self.screen.blit(self.background, (0, 0))
+    def region_index_at(self, mouse_pos):
+        """Index of the region whose row is under mouse_pos, or None. Computed from the row, no scan."""
+        list_rect, row_height, _ = self.region_list_layout()
+        if not list_rect.collidepoint(mouse_pos):
+            return None
+        index = self.region_scroll + int((mouse_pos[1] - self.screen_height * REGION_BUTTON_TOP_MARGIN_PCT) // row_height)
+        return index if 0 <= index < len(self.region_names) else None
+
+    def scroll_region_list(self, rows):
+        visible_rows = self.region_list_layout()[2]
+        self.region_scroll = max(0, min(self.region_scroll + rows, len(self.region_names) - visible_rows))
+
+    def select_region(self, index):
+        """Open the region at `index`, scrolling the list to it if needed."""
+        self.current_region_index = index
+        self.current_region = self.region_names[index]
+        visible_rows = self.region_list_layout()[2]
+        if index < self.region_scroll:
+            self.region_scroll = index
+        elif index >= self.region_scroll + visible_rows:
+            self.region_scroll = index - visible_rows + 1
+
+    def handle_region_clicks(self, mouse_pos, button=1):
+        if button == 4:  # Mouse wheel up
+            self.scroll_region_list(-1)
+        elif button == 5:  # Mouse wheel down
+            self.scroll_region_list(1)
         else:
-            self.screen.fill(WHITE)
+            index = self.region_index_at(mouse_pos)
+            if index is not None:
+                self.select_region(index)
 
+    def draw(self):
+        """Draw and present the frame. Returns False if nothing changed since the last one."""
+        frame_start = time.perf_counter()
+        if self.perf_hud:
+            self.update_perf_stats()
+        self.draw_timer.reset()
+        changed = self.draw_frame()
+        if changed:
+            self.last_frame_ms = (time.perf_counter() - frame_start) * 1000
+            self.last_draw_timings = self.draw_timer.timings
+            self.perf_frames += 1
+            if self.perf_csv_writer:
+                self.write_perf_row()
+        return changed
+
+    def draw_frame(self):
         self.update_button_hover()  # Update hover state
-        self.draw_resources()
-        self.draw_map()
-        self.draw_game_log()
-        self.draw_progress_window()
-        
-        # Draw all buttons
-        self.draw_next_turn_button()
-        self.draw_view_market_button()
-        self.draw_win_conditions_button()
-        self.draw_help_button()
-        self.draw_exit_button()
-        
+
+        screen_state, panels = self.get_panel_states()
+        self.draw_timer.lap("prepare")
+        if self.full_redraw_needed or screen_state != self.last_screen_state:
+            self.full_redraw_needed = False
+            self.last_screen_state = screen_state
+            self.last_panel_states = panels
+            self.draw_scene(panels)
+            pygame.display.flip()
+            self.draw_timer.lap("present")
+            return True
+
+        # Redraw only the areas covered by changed panels, before and after the change
+        dirty_rects = []
+        for name, (rect, state) in panels.items():
+            old_rect, old_state = self.last_panel_states.get(name, (None, None))
+            if state == old_state and rect == old_rect:
+                continue
+            for changed_rect in (old_rect, rect):
+                if changed_rect is not None and changed_rect.width > 0 and changed_rect.height > 0:
+                    dirty_rects.append(changed_rect.clip(self.screen.get_rect()))
+        self.last_panel_states = panels
+        if not dirty_rects:
+            return False
+
+        if not self.dirty_rect_rendering:
+            self.draw_scene(panels)
+            pygame.display.flip()
+            self.draw_timer.lap("present")
+            return True
+
+        dirty_rects = self.merge_rects(dirty_rects)
+        for rect in dirty_rects:
+            self.screen.set_clip(rect)
+            self.draw_scene(panels)
+        self.screen.set_clip(None)
+        pygame.display.update(dirty_rects)
+        self.draw_timer.lap("present")
+        return True
+
+    @staticmethod
+    def merge_rects(rects):
+        """Merge overlapping rectangles so no area is redrawn twice."""
+        merged = []
+        for rect in rects:
+            rect = pygame.Rect(rect)
+            index = rect.collidelist(merged)
+            while index != -1:
+                rect.union_ip(merged.pop(index))
+                index = rect.collidelist(merged)
+            merged.append(rect)
+        return merged
+
+    def get_panel_states(self):
+        """Screen-wide state (changes force a full redraw) and the rect and state of every dynamic panel."""
+        player = self.sim.player
+        modal_state = None
+        if self.modal in ("progress", "market"):
+            modal_state = (self.sim.turn_count, player.money, player.owned_tea_percentage,
+                           tuple((company.money, company.owned_tea_percentage) for company in self.sim.companies))
+        if self.modal == "market":
+            modal_state += (self.market_view, self.chart_span, self.chart_first)
+        screen_state = (self.screen.get_size(), self.modal, self.sim.game_over, modal_state)
+
+        panels = {
+            "region_list": (self.region_list_layout()[0], (self.region_scroll, len(self.region_names))),
+            "resources": (self.layout_resources()[0], (player.money, player.tea_leaves, player.processed_tea)),
+            "game_log": (self.game_log_rect, (self.sim.log.total, len(self.sim.log), self.message_scroll_offset)),
+            "progress": (self.progress_panel_rect(), (player.money, player.owned_tea_percentage, self.sim.turn_count,
+                                              self.sim.global_tea_supply > 0)),
+        }
+        hover_rect = self.hover_text_rect()
+        panels["hover"] = (hover_rect, hover_rect and self.hovered_button)
+
+        if self.current_region:
+            region = self.sim.regions[self.current_region]
+            region_state = (self.current_region, region.tea_leaves_cost, region.labor_cost, region.current_tea_price,
+                            region.tax_rate, self.sim.workforce.version, tuple(self.order_quantities.values()),
+                            self.editing_quantity, self.quantity_text)
+            panels["region"] = (self.region_window_layout()[0], region_state)
+        else:
+            panels["region"] = (None, None)
+
+        if self.perf_hud:
+            panels["perf_hud"] = (self.perf_hud_rect(), self.perf_stats)
+        else:
+            panels["perf_hud"] = (None, None)
+        return screen_state, panels
+
+    def draw_scene(self, panels=None):
+        """Draw the whole frame into self.screen (respecting its clip rect). Every dynamic panel
+        only draws inside its rect from `panels` (see get_panel_states)."""
+        if panels is None:
+            panels = self.get_panel_states()[1]
+        timer = self.draw_timer
+        timer.mark()
+        # Background, region buttons, panel frames and buttons are one pre-composed surface
+        if self.static_layer is None:
+            self.static_layer = self.build_static_layer()
+        self.screen.blit(self.static_layer, (0, 0))
+        timer.lap("background")
+
+        self.draw_panel(panels["region_list"][0], self.draw_region_list)
+        timer.lap("region_list")
+
+        self.draw_panel(panels["resources"][0], self.draw_resources)
+        timer.lap("resources")
+        self.draw_panel(panels["game_log"][0], self.draw_game_log)
+        timer.lap("game_log")
+        self.draw_panel(panels["progress"][0], self.draw_progress_window)
+        timer.lap("progress")
+
         # Draw hover text last so it appears on top
-        self.draw_button_hover_text()
+        self.draw_panel(panels["hover"][0], self.draw_button_hover_text)
+        timer.lap("hover_text")
 
         if self.current_region:
-            self.draw_region_window(self.current_region)
+            self.draw_panel(panels["region"][0], self.draw_region_window, self.current_region)
+        timer.lap("region")
 
-        if self.showing_help:
+        if self.modal == "help":
             self.show_help()
-
-        if self.showing_win_conditions:
+        elif self.modal == "progress":
             self.show_win_conditions()
+        elif self.modal == "market":
+            self.show_market_information()
+        timer.lap("modal")
 
-        if self.game_over:
+        if self.sim.game_over:
             self.draw_game_over_screen()
+        timer.lap("game_over")
+
+        if self.perf_hud:
+            self.draw_panel(panels["perf_hud"][0], self.draw_perf_hud)
+        timer.lap("perf_hud")
+
+    def draw_panel(self, rect, draw, *args):
+        """Call a panel's draw function with drawing limited to the panel's rect, so a full redraw
+        never leaves pixels that a dirty-rect redraw of the panel would not clear. No rect, no panel."""
+        if rect is None:
+            return
+        clip = self.screen.get_clip()
+        self.screen.set_clip(clip.clip(rect))
+        draw(*args)
+        self.screen.set_clip(clip)
+
+    def build_static_layer(self):
+        """Compose everything that only changes on resize into a single surface."""
+        layer = pygame.Surface((self.screen_width, self.screen_height)).convert()
+        if self.background:
+            layer.blit(self.background, (0, 0))
+        else:
+            layer.fill(WHITE)
+
+        self.draw_game_log_frame(layer)
+        self.draw_progress_frame(layer)
+        self.draw_buttons(layer)
+        return layer
+
+    def draw_buttons(self, surface):
+        buttons = [
+            ("next_turn", self.next_turn_button_rect),
+            ("view_market", self.view_market_button_rect),
+            ("win_progress", self.win_conditions_button_rect),
+            ("help", self.help_button_rect),
+            ("exit", self.exit_button_rect),
+        ]
+        for button_name, button_rect in buttons:
+            if self.button_icons[button_name]:
+                surface.blit(self.button_icons[button_name], button_rect)
 
-        pygame.display.flip()
-
-    def draw_next_turn_button(self):
-        #pygame.draw.rect(self.screen, WHITE, self.next_turn_button_rect)
-        #pygame.draw.rect(self.screen, GRAY, self.next_turn_button_rect, 2)
-        if self.button_icons["next_turn"]:
-            self.screen.blit(self.button_icons["next_turn"], self.next_turn_button_rect)
-
-    def draw_exit_button(self):
-        #pygame.draw.rect(self.screen, WHITE, self.exit_button_rect)
-        #pygame.draw.rect(self.screen, GRAY, self.exit_button_rect, 2)
-        if self.button_icons["exit"]:
-            self.screen.blit(self.button_icons["exit"], self.exit_button_rect)
-
-    def draw_view_market_button(self):
-        #pygame.draw.rect(self.screen, WHITE, self.view_market_button_rect)
-        #pygame.draw.rect(self.screen, GRAY, self.view_market_button_rect, 2)
-        if self.button_icons["view_market"]:
-            self.screen.blit(self.button_icons["view_market"], self.view_market_button_rect)
-
-    def draw_help_button(self):
-        #pygame.draw.rect(self.screen, WHITE, self.help_button_rect)
-        #pygame.draw.rect(self.screen, GRAY, self.help_button_rect, 2)
-        if self.button_icons["help"]:
-            self.screen.blit(self.button_icons["help"], self.help_button_rect)
-
-    def draw_win_conditions_button(self):
-        #pygame.draw.rect(self.screen, WHITE, self.win_conditions_button_rect)
-        #pygame.draw.rect(self.screen, GRAY, self.win_conditions_button_rect, 2)
-        if self.button_icons["win_progress"]:
-            self.screen.blit(self.button_icons["win_progress"], self.win_conditions_button_rect)
+    def hover_text_rect(self):
+        """Background rect of the button hover text, or None if no button is hovered."""
+        if not self.hovered_button:
+            return None
+        return self.layout_hover_text()[1].inflate(10, 10)
+
+    def layout_hover_text(self):
+        mouse_pos = pygame.mouse.get_pos()
+        text = self.render_text(self.font_large, self.widgets[self.hovered_button].hover_text, BLACK)
+        text_rect = text.get_rect()
+        # Position text above the cursor
+        text_rect.midbottom = (mouse_pos[0], mouse_pos[1] - 10)
+        # Ensure text stays within screen bounds
+        if text_rect.left < 0:
+            text_rect.left = 0
+        if text_rect.right > self.screen_width:
+            text_rect.right = self.screen_width
+        if text_rect.top < 0:
+            text_rect.top = 0
+        return text, text_rect
 
     def draw_button_hover_text(self):
         if self.hovered_button:
-            mouse_pos = pygame.mouse.get_pos()
-            hover_texts = {
-                "next_turn": "Следующий ход",
-                "view_market": "Рынок",
-                "win_progress": "Прогресс",
-                "help": "Справка",
-                "exit": "Выход"
-            }
-            text = self.font_large.render(hover_texts[self.hovered_button], True, BLACK)
-            text_rect = text.get_rect()
-            # Position text above the cursor
-            text_rect.midbottom = (mouse_pos[0], mouse_pos[1] - 10)
-            # Ensure text stays within screen bounds
-            if text_rect.left < 0:
-                text_rect.left = 0
-            if text_rect.right > self.screen_width:
-                text_rect.right = self.screen_width
-            if text_rect.top < 0:
-                text_rect.top = 0
+            text, text_rect = self.layout_hover_text()
             # Draw text with white background for better visibility
             padding = 5
             bg_rect = text_rect.inflate(padding * 2, padding * 2)
@@ -687,20 +1041,8 @@ class Game:
             self.screen.blit(text, text_rect)
 
     def update_button_hover(self):
-        mouse_pos = pygame.mouse.get_pos()
-        # Check each button in order
-        if self.next_turn_button_rect.collidepoint(mouse_pos):
-            self.hovered_button = "next_turn"
-        elif self.view_market_button_rect.collidepoint(mouse_pos):
-            self.hovered_button = "view_market"
-        elif self.win_conditions_button_rect.collidepoint(mouse_pos):
-            self.hovered_button = "win_progress"
-        elif self.help_button_rect.collidepoint(mouse_pos):
-            self.hovered_button = "help"
-        elif self.exit_button_rect.collidepoint(mouse_pos):
-            self.hovered_button = "exit"
-        else:
-            self.hovered_button = None
+        widget = self.widgets.widget_at(pygame.mouse.get_pos())
+        self.hovered_button = widget.name if widget is not None and widget.hover_text else None
 
     def show_help(self):
         # Semi-transparent overlay covering the entire screen
@@ -719,7 +1061,7 @@ class Game:
 
         # Render help text lines with more spacing
         text_y = y + 40  # Increased initial padding
-        title = self.font_large.render("Справка", True, BLACK)
+        title = self.render_text(self.font_large, "Справка", BLACK)
         title_x = x + (width - title.get_width()) // 2  # Center the title
         self.screen.blit(title, (title_x, text_y))
         text_y += 60  # More space after title
@@ -728,7 +1070,7 @@ class Game:
             if line == "":  # Add more spacing for empty lines
                 text_y += 20
                 continue
-            text_surface = self.font_medium.render(line, True, BLACK)
+            text_surface = self.render_text(self.font_medium, line, BLACK)
             # Center shorter lines, left-align longer ones
             if len(line) < 20:  # Adjust this threshold as needed
                 text_x = x + (width - text_surface.get_width()) // 2
@@ -753,40 +1095,44 @@ class Game:
         pygame.draw.rect(self.screen, BLACK, (x, y, width, height), 3)
 
         text_y = y + 40
-        title = self.font_large.render("Прогресс", True, BLACK)
+        title = self.render_text(self.font_large, "Прогресс", BLACK)
         title_x = x + (width - title.get_width()) // 2  # Center the title
         self.screen.blit(title, (title_x, text_y))
         text_y += 60
 
         # Show current turn
-        turn_text = self.font_medium.render(f"Ход: {self.turn_count}", True, BLACK)
+        turn_text = self.render_text(self.font_medium, f"Ход: {self.sim.turn_count}", BLACK)
         self.screen.blit(turn_text, (x + 40, text_y))
         text_y += 40
 
         # Show player money progress
-        player_money_text = self.font_medium.render(f"Деньги игрока: ${self.player.money:,.2f} / ${self.target_money:,.2f}", True, BLACK)
+        player_money_text = self.render_text(self.font_medium, f"Деньги игрока: ${self.sim.player.money:,.2f} / ${self.sim.target_money:,.2f}", BLACK)
         self.screen.blit(player_money_text, (x + 40, text_y))
         text_y += 40
 
         # Show player monopoly progress
-        player_monopoly = self.player.owned_tea_percentage * 100
-        monopoly_text = self.font_medium.render(f"Доля игрока: {player_monopoly:.2f}% / {self.monopoly_threshold*100}%", True, BLACK)
+        player_monopoly = self.sim.player.owned_tea_percentage * 100
+        monopoly_text = self.render_text(self.font_medium, f"Доля игрока: {player_monopoly:.2f}% / {self.sim.monopoly_threshold*100}%", BLACK)
         self.screen.blit(monopoly_text, (x + 40, text_y))
         text_y += 60
 
         # Competitors progress
-        title = self.font_medium.render("Прогресс конкурентов:", True, BLACK)
+        title = self.render_text(self.font_medium, "Прогресс конкурентов:", BLACK)
         self.screen.blit(title, (x + 40, text_y))
         text_y += 40
 
-        for company in self.companies:
-            money_text = self.font_medium.render(f"Деньги {company.name}: ${company.money:,.2f} / ${self.target_money:,.2f}", True, BLACK)
+        companies, hidden = self.listed_companies(lambda company: company.money)
+        for company in companies:
+            money_text = self.render_text(self.font_medium, f"Деньги {company.name}: ${company.money:,.2f} / ${self.sim.target_money:,.2f}", BLACK)
             self.screen.blit(money_text, (x + 60, text_y))
             text_y += 35
             share = company.owned_tea_percentage * 100
-            share_text = self.font_medium.render(f"Доля {company.name}: {share:.2f}% / {self.monopoly_threshold*100}%", True, BLACK)
+            share_text = self.render_text(self.font_medium, f"Доля {company.name}: {share:.2f}% / {self.sim.monopoly_threshold*100}%", BLACK)
             self.screen.blit(share_text, (x + 60, text_y))
             text_y += 50
+        if hidden:
+            more_text = self.render_text(self.font_medium, f"... и ещё компаний: {hidden}", BLACK)
+            self.screen.blit(more_text, (x + 60, text_y))
 
     def show_market_information(self):
         # Semi-transparent overlay
@@ -796,18 +1142,15 @@ class Game:
         self.screen.blit(overlay, (0, 0))
 
         # Market information window
-        width = int(0.5 * self.screen_width)
-        height = int(0.9 * self.screen_height)
-        x = (self.screen_width - width) // 2
-        y = (self.screen_height - height) // 2
-        
+        x, y, width, height = self.market_window_layout()
+
         # Semi-transparent window background
         window_bg = pygame.Surface((width, height))
         window_bg.fill((255, 255, 255, 255))
         self.screen.blit(window_bg, (x, y))
 
         text_y = y + 40
-        title = self.font_large.render("Информация о рынке", True, BLACK)
+        title = self.render_text(self.font_large, "Информация о рынке", BLACK)
         title_x = x + (width - title.get_width()) // 2
         self.screen.blit(title, (title_x, text_y))
         text_y += 60
@@ -816,15 +1159,22 @@ class Game:
         text_x = x + 40
         
         # Total Tea Supply
-        total_supply_text = self.font_medium.render(f"Общее предложение чая: {self.global_tea_supply:.2f}", True, BLACK)
+        total_supply_text = self.render_text(self.font_medium, f"Общее предложение чая: {self.sim.global_tea_supply:.2f}", BLACK)
         self.screen.blit(total_supply_text, (text_x, text_y))
         text_y += 40
 
         # Market Demand
-        market_demand_text = self.font_medium.render(f"Общий спрос на чай: {self.global_tea_demand}", True, BLACK)
+        market_demand_text = self.render_text(self.font_medium, f"Общий спрос на чай: {self.sim.global_tea_demand}", BLACK)
         self.screen.blit(market_demand_text, (text_x, text_y))
         text_y += 60
 
+        close_y = y + height - 60
+        if self.market_view == "charts":
+            self.draw_market_charts()
+            hint = "Tab - таблица, +/- масштаб, колесо - регионы. Нажмите, чтобы закрыть"
+            self.draw_market_hint(self.font_small, hint, x, width, close_y)
+            return
+
         # Table headers
         col_width_region = int(width * 0.4)  # 40% for region names
         col_width_price = int(width * 0.15)  # 15% for each price column
@@ -835,7 +1185,7 @@ class Game:
         col_widths = [col_width_region, col_width_price, col_width_price, col_width_price]
         
         for header, col_width in zip(headers, col_widths):
-            header_text = self.font_medium.render(header, True, BLACK)
+            header_text = self.render_text(self.font_medium, header, BLACK)
             self.screen.blit(header_text, (header_x, text_y))
             header_x += col_width
         text_y += 40
@@ -844,48 +1194,134 @@ class Game:
         pygame.draw.line(self.screen, BLACK, (text_x, text_y), (text_x + sum(col_widths), text_y), 2)
         text_y += 20
 
-        # Table content
-        for region_name, region in self.regions.items():
+        # Table content: as many rows as fit above the close instruction
+        regions = self.sim.regions
+        max_rows = max(1, (close_y - text_y) // 35)
+        hidden = len(regions) - max_rows + 1 if len(regions) > max_rows else 0  # The last row says how many are left out
+        for region_name, region in islice(regions.items(), len(regions) - hidden):
             col_x = text_x
             
             # Region name (left-aligned)
-            region_text = self.font_medium.render(region_name, True, BLACK)
+            region_text = self.render_text(self.font_medium, region_name, BLACK)
             self.screen.blit(region_text, (col_x, text_y))
             col_x += col_width_region
             
             # Leaves cost
-            leaves_cost_text = self.font_medium.render(f"${region.tea_leaves_cost:.2f}", True, BLACK)
+            leaves_cost_text = self.render_text(self.font_medium, f"${region.tea_leaves_cost:.2f}", BLACK)
             self.screen.blit(leaves_cost_text, (col_x, text_y))
             col_x += col_width_price
             
             # Worker cost
-            worker_cost_text = self.font_medium.render(f"${region.labor_cost:.2f}", True, BLACK)
+            worker_cost_text = self.render_text(self.font_medium, f"${region.labor_cost:.2f}", BLACK)
             self.screen.blit(worker_cost_text, (col_x, text_y))
             col_x += col_width_price
             
             # Tea price
-            price_text = self.font_medium.render(f"${region.current_tea_price:.2f}", True, BLACK)
+            price_text = self.render_text(self.font_medium, f"${region.current_tea_price:.2f}", BLACK)
             self.screen.blit(price_text, (col_x, text_y))
             
             text_y += 35
+        if hidden:
+            more_text = self.render_text(self.font_medium, f"... и ещё регионов: {hidden}", BLACK)
+            self.screen.blit(more_text, (text_x, text_y))
 
         # Close instruction at the bottom
-        close_text = self.font_medium.render("Нажмите, чтобы закрыть", True, BLACK)
+        self.draw_market_hint(self.font_medium, "Tab - графики цен. Нажмите, чтобы закрыть", x, width, close_y)
+
+    def draw_market_hint(self, font, hint, x, width, close_y):
+        close_text = self.render_text(font, hint, BLACK)
         close_x = x + (width - close_text.get_width()) // 2
-        close_y = y + height - 60
         self.screen.blit(close_text, (close_x, close_y))
 
-        pygame.display.flip()
+    def market_window_layout(self):
+        """(x, y, width, height) of the market window."""
+        width = int(0.5 * self.screen_width)
+        height = int(0.9 * self.screen_height)
+        return (self.screen_width - width) // 2, (self.screen_height - height) // 2, width, height
+
+    def market_chart_layout(self):
+        """(area, label height, chart size, rows) of the chart grid: CHART_COLUMNS charts per row,
+        each under a line with the region name, as many rows as fit in the area."""
+        x, y, width, height = self.market_window_layout()
+        # Below the title, supply and demand lines and a legend line, above the close instruction
+        area = pygame.Rect(x + 40, y + 230, width - 80, height - 300)
+        label_height = self.font_small.get_linesize()
+        chart_width = (area.width - 20 * (CHART_COLUMNS - 1)) // CHART_COLUMNS
+        chart_height = max(20, int(CHART_HEIGHT_PCT * self.screen_height))
+        rows = max(1, (area.height + 10) // (label_height + chart_height + 10))
+        return area, label_height, (chart_width, chart_height), rows
+
+    def draw_market_charts(self):
+        """Price and cost history of the regions from chart_first on. Each chart is cached and only
+        gets the segments of the turns played since it was last shown."""
+        area, label_height, size, rows = self.market_chart_layout()
+        if self.sim.history is None:
+            text = self.render_text(self.font_medium, "История цен не записывается", BLACK)
+            self.screen.blit(text, area.topleft)
+            return
+        table = self.sim.history["regions"]
+
+        # Legend, then the zoom level on the right
+        legend_x = area.x
+        legend_y = area.y - 30
+        for metric, color in CHART_COLORS.items():
+            pygame.draw.line(self.screen, color, (legend_x, legend_y + 7), (legend_x + 20, legend_y + 7), 3)
+            text = self.render_text(self.font_small, CHART_LABELS[metric], BLACK)
+            self.screen.blit(text, (legend_x + 25, legend_y))
+            legend_x += 45 + text.get_width()
+        text = self.render_text(self.font_small, f"Ходов: {self.chart_span}", BLACK)
+        self.screen.blit(text, (area.right - text.get_width(), legend_y))
+
+        key = (size, self.chart_span, table)
+        if key != self.market_charts_key:
+            self.market_charts = {}  # Resized, zoomed or another game: every chart is drawn anew
+            self.market_charts_key = key
+        charts = {}
+        names = self.region_names[self.chart_first:self.chart_first + rows * CHART_COLUMNS]
+        for i, name in enumerate(names):
+            chart = self.market_charts.get(name) or HistoryChart(table, name, CHART_AXES, CHART_COLORS,
+                                                                 size, self.chart_span)
+            charts[name] = chart
+            cell_x = area.x + (i % CHART_COLUMNS) * (size[0] + 20)
+            cell_y = area.y + (i // CHART_COLUMNS) * (label_height + size[1] + 10)
+            region = self.sim.regions[name]
+            label = self.render_text(self.font_small, f"{name}: чай ${region.current_tea_price:.2f}", BLACK)
+            self.screen.blit(label, (cell_x, cell_y), pygame.Rect(0, 0, size[0], label_height))
+            chart_rect = pygame.Rect((cell_x, cell_y + label_height), size)
+            self.screen.blit(chart.update(), chart_rect)
+            pygame.draw.rect(self.screen, GRAY, chart_rect, 1)
+        self.market_charts = charts  # Charts scrolled out of view are dropped
+
+    def handle_market_input(self, event):
+        """Tab switches the market window between the table and the charts; in the charts +/- zoom
+        and the wheel or UP/DOWN scroll through the regions. Returns False for anything else."""
+        if event.type == pygame.KEYDOWN and event.key == pygame.K_TAB:
+            self.market_view = "charts" if self.market_view == "table" else "table"
+            return True
+        if self.market_view != "charts":
+            return False
+        if event.type == pygame.MOUSEBUTTONDOWN and event.button in (4, 5):
+            self.scroll_market_charts(-1 if event.button == 4 else 1)
+        elif event.type == pygame.KEYDOWN and event.key in (pygame.K_UP, pygame.K_DOWN):
+            self.scroll_market_charts(-1 if event.key == pygame.K_UP else 1)
+        elif event.type == pygame.KEYDOWN and event.key in (pygame.K_PLUS, pygame.K_EQUALS, pygame.K_KP_PLUS):
+            self.zoom_market_charts(-1)
+        elif event.type == pygame.KEYDOWN and event.key in (pygame.K_MINUS, pygame.K_KP_MINUS):
+            self.zoom_market_charts(1)
+        else:
+            return False
+        return True
+
+    def scroll_market_charts(self, rows):
+        _, _, _, visible_rows = self.market_chart_layout()
+        total_rows = -(-len(self.region_names) // CHART_COLUMNS)
+        first_row = self.chart_first // CHART_COLUMNS + rows
+        self.chart_first = max(0, min(first_row, total_rows - visible_rows)) * CHART_COLUMNS
 
-        # Wait for click or key to close
-        waiting = True
-        while waiting:
-            for event in pygame.event.get():
-                if event.type == pygame.QUIT:
-                    waiting = False
-                    self.running = False
-                if event.type == pygame.KEYDOWN or event.type == pygame.MOUSEBUTTONDOWN:
-                    waiting = False
+    def zoom_market_charts(self, steps):
+        """Show fewer (steps < 0) or more turns per chart."""
+        index = CHART_SPANS.index(self.chart_span) + steps
+        self.chart_span = CHART_SPANS[max(0, min(index, len(CHART_SPANS) - 1))]
 
     def draw_game_over_screen(self):
         """Draws the game over screen with the winner."""
@@ -893,52 +1329,26 @@ class Game:
         overlay.fill((0, 0, 0, 150))  # Semi-transparent black
         self.screen.blit(overlay, (0, 0))
 
-        font = pygame.font.Font(None, int(0.048 * self.screen_height))
-        if self.winner:
-            text = font.render(f"Победитель - {self.winner}!", True, WHITE)
+        font = self.get_font(int(0.048 * self.screen_height))
+        if self.sim.winner:
+            text = self.render_text(font, f"Победитель - {self.sim.winner}!", WHITE)
         else:
-             text = font.render(f"Игра окончена!", True, WHITE)
+             text = self.render_text(font, f"Игра окончена!", WHITE)
         text_rect = text.get_rect(center=(int(0.5 * self.screen_width), int(0.5 * self.screen_height)))
         self.screen.blit(text, text_rect)
 
-        restart_text = font.render("Нажмите любую клавишу для выхода", True, WHITE)
+        restart_text = self.render_text(font, "Нажмите любую клавишу для выхода", WHITE)
         restart_rect = restart_text.get_rect(center=(int(0.5 * self.screen_width), int(0.5 * self.screen_height + 50)))
         self.screen.blit(restart_text, restart_rect)
 
-        pygame.display.flip()
-
-        waiting = True
-        while waiting:
-            for event in pygame.event.get():
-                if event.type == pygame.QUIT:
-                    waiting = False
-                    self.running = False
-                if event.type == pygame.KEYDOWN or event.type == pygame.MOUSEBUTTONDOWN:
-                    waiting = False
-                    self.running = False
-
     def next_turn(self):
-        if not self.game_over:
-            self.turn_count += 1  # Increment turn count
-            self.process_turn()
-            self.update_market_prices()
-            self.messages.append(f"--- Ход {self.turn_count} ---")
-            
-            # Check win/lose conditions after each turn
-            if self.check_win_condition():
-                self.showing_win_conditions = True
-                self.messages.append(f"{self.winner} выиграл игру!")
-            elif self.check_lose_condition():
-                self.showing_win_conditions = True
-                self.messages.append(f"Игра окончена! Победитель: {self.winner}!")
-            else:
-                # Show progress towards victory conditions
-                money_progress = (self.player.money / self.target_money) * 100
-                market_share = (self.player.owned_tea_percentage * 100)
-                #self.messages.append(f"Прогресс - Деньги: {money_progress:.1f}%, Доля на рынке: {market_share:.1f}%")
-                self.showing_win_conditions = True
+        if not self.sim.game_over:
+            self.sim.next_turn()
+            # Show progress towards victory conditions (or the final result)
+            self.modal = "progress"
 
-    def draw_resources(self):
+    def layout_resources(self):
+        """Panel rect, text surfaces and column width of the resources window."""
         # Create a background rectangle for resources with reduced height
         padding = 20
         col_spacing = 20
@@ -954,19 +1364,19 @@ class Game:
         
         # Calculate maximum width needed for labels
         label_surfaces = [
-            self.font_medium.render(label, True, BLACK)
+            self.render_text(self.font_medium, label, BLACK)
             for label in [money_label, leaves_label, tea_label]
         ]
         left_col_width = max(surface.get_width() for surface in label_surfaces)
         
         # Calculate values for right column
-        money_text = f"${self.player.money:,.2f}"
-        leaves_text = str(self.player.tea_leaves)
-        tea_text = str(self.player.processed_tea)
+        money_text = f"${self.sim.player.money:,.2f}"
+        leaves_text = str(self.sim.player.tea_leaves)
+        tea_text = str(self.sim.player.processed_tea)
         
         # Calculate maximum width needed for values
         value_surfaces = [
-            self.font_medium.render(text, True, BLACK)
+            self.render_text(self.font_medium, text, BLACK)
             for text in [money_text, leaves_text, tea_text]
         ]
         right_col_width = max(surface.get_width() for surface in value_surfaces)
@@ -974,55 +1384,174 @@ class Game:
         # Calculate total width and height
         total_width = left_col_width + col_spacing + right_col_width + padding * 2
         total_height = int(self.screen_height * RESOURCES_HEIGHT_PCT)
+        return pygame.Rect(0, 0, total_width, total_height), label_surfaces, value_surfaces, left_col_width
+
+    def draw_resources(self):
+        padding = 20
+        col_spacing = 20
+        rect, label_surfaces, value_surfaces, left_col_width = self.layout_resources()
+        total_width, total_height = rect.size
 
         # Create semi-transparent background
         bg_surface = self.create_semi_transparent_surface(total_width, total_height)
         self.screen.blit(bg_surface, (0, 0))
         pygame.draw.rect(self.screen, GRAY, (0, 0, total_width, total_height), 2)
         
-        # Draw text
+        # Draw text (reusing the surfaces measured above)
         y = padding
-        for label, value in [
-            (money_label, money_text),
-            (leaves_label, leaves_text),
-            (tea_label, tea_text)
-        ]:
-            label_surface = self.font_medium.render(label, True, BLACK)
-            value_surface = self.font_medium.render(value, True, BLACK)
+        for label_surface, value_surface in zip(label_surfaces, value_surfaces):
             self.screen.blit(label_surface, (padding, y))
             self.screen.blit(value_surface, (padding + left_col_width + col_spacing, y))
             y += self.font_medium.get_height() + 5
 
-    def draw_map(self):
-        for region_name, button_rect in self.region_buttons.items():
+    def draw_region_list(self):
+        """Blit the region list, re-rendering its visible rows only after a scroll or resize."""
+        list_rect = self.region_list_layout()[0]
+        state = (self.region_scroll, len(self.region_names), list_rect)
+        if self.region_list_layer is None or state != self.region_list_state:
+            # Rows are semi-transparent, so the layer starts from the background behind them
+            layer = self.static_layer.subsurface(list_rect.clip(self.static_layer.get_rect())).copy()
+            self.draw_map(layer, list_rect.topleft)
+            self.region_list_layer = layer
+            self.region_list_state = state
+        self.screen.blit(self.region_list_layer, list_rect.topleft)
+
+    def draw_map(self, surface=None, origin=(0, 0)):
+        """Draw the rows of the region list that are on screen; `origin` is where `surface` is on the screen."""
+        surface = surface or self.screen
+        list_rect, _, visible_rows = self.region_list_layout()
+        first = self.region_scroll
+        last = min(first + visible_rows, len(self.region_names))
+        self.load_region_icons(self.region_names[first:last])
+        icon_size = int(REGION_ICON_SIZE_PCT * self.screen_height)
+        for index in range(first, last):
+            region_name = self.region_names[index]
+            button_rect = self.region_row_rect(index).move(-origin[0], -origin[1])
             # Draw semi-transparent white button background
             bg_surface = self.create_semi_transparent_surface(button_rect.width, button_rect.height)
-            self.screen.blit(bg_surface, button_rect)
-            pygame.draw.rect(self.screen, GRAY, button_rect, 2)
+            surface.blit(bg_surface, button_rect)
+            pygame.draw.rect(surface, GRAY, button_rect, 2)
             
             # Draw region name (left-aligned) with medium font
-            region_text = self.font_medium.render(region_name, True, BLACK)
+            region_text = self.render_text(self.font_medium, region_name, BLACK)
             text_x = button_rect.x + 10
             text_y = button_rect.centery - region_text.get_height() // 2
-            self.screen.blit(region_text, (text_x, text_y))
+            surface.blit(region_text, (text_x, text_y))
             
             # Draw region icon if available
             if self.region_icons[region_name]:
-                icon_size = int(REGION_ICON_SIZE_PCT * self.screen_height)
                 icon_x = button_rect.right - icon_size - 10
                 icon_y = button_rect.centery - icon_size // 2
-                self.screen.blit(self.region_icons[region_name], (icon_x, icon_y))
-
-    def draw_region_window(self, region_name):
-        region = self.regions[region_name]
-        mouse_pos = pygame.mouse.get_pos()
-        
+                surface.blit(self.region_icons[region_name], (icon_x, icon_y))
+
+        # Scrollbar along the right edge when not every region fits
+        if len(self.region_names) > visible_rows:
+            track = list_rect.move(-origin[0], -origin[1])
+            thumb_height = max(10, track.height * visible_rows // len(self.region_names))
+            thumb_y = track.top + (track.height - thumb_height) * first // (len(self.region_names) - visible_rows)
+            pygame.draw.rect(surface, GRAY, (track.right - REGION_SCROLLBAR_WIDTH - 2, thumb_y,
+                                             REGION_SCROLLBAR_WIDTH, thumb_height))
+
+    def region_icon_requests(self, region_names):
+        """AssetManager requests for the icons of these regions (those that have one)."""
+        icon_size = int(REGION_ICON_SIZE_PCT * self.screen_height)
+        return {("region", region_name): (self.world[region_name]["icon"], (icon_size, icon_size))
+                for region_name in region_names
+                if self.world.get(region_name, {}).get("icon")}
+
+    def load_region_icons(self, region_names):
+        """Load the icons of these regions that were never loaded, in one batch."""
+        missing = [region_name for region_name in region_names if region_name not in self.region_icons]
+        if not missing:
+            return
+        images = self.assets.load_all(self.region_icon_requests(missing))
+        for region_name in missing:
+            self.region_icons[region_name] = images.get(("region", region_name))
+
+    def listed_companies(self, key):
+        """Competitors to name in a window and how many are left out: all of them, or the leaders by `key`."""
+        companies = self.sim.companies
+        if len(companies) <= MAX_LISTED_COMPANIES:
+            return companies, 0
+        # The "and N more" line takes the place of the last company so the window keeps its height
+        shown = MAX_LISTED_COMPANIES - 1
+        return heapq.nlargest(shown, companies, key=key), len(companies) - shown
+
+    def region_window_layout(self):
+        """Rects of the region window and of its hire, fire, buy and sell buttons."""
         # Center the window in the middle of the screen
         window_width = int(REGION_INFO_WIDTH_PCT * self.screen_width)
         window_height = int(REGION_INFO_HEIGHT_PCT * self.screen_height)
+        # The stats above the controls use fixed-size fonts: title, three prices, player,
+        # listed companies and tax rate. On short screens grow the window so the quantity
+        # fields (from 72% of the height down) never cover them.
+        stats_height = 50 + 40 * 3 + 30 * (MAX_LISTED_COMPANIES + 2)
+        window_height = min(self.screen_height, max(window_height, int((stats_height + 10) / 0.67)))
         x = (self.screen_width - window_width) // 2
         y = (self.screen_height - window_height) // 2
-        
+        text_x = x + window_width * 0.05  # 5% margin from left
+
+        # Buttons section at the bottom of the window, below a row of order quantity fields
+        button_section_y = y + window_height - window_height * 0.22  # Start buttons 22% from bottom
+        button_width = int(window_width * 0.2)  # 20% of window width
+        button_height = int(window_height * 0.08)  # 8% of window height
+        button_margin = 20
+
+        # Order quantities: workers above Hire/Fire, goods above Buy/Sell
+        box_height = int(window_height * 0.06)
+        box_y = button_section_y - box_height - 10
+        workers_box_rect = pygame.Rect(text_x, box_y, button_width * 2, box_height)
+        goods_box_rect = pygame.Rect(text_x + button_width * 2 + button_margin, box_y, button_width * 2, box_height)
+
+        # Hire/Fire Buttons
+        hire_button_rect = pygame.Rect(text_x, button_section_y, button_width*2, button_height)
+        fire_button_rect = pygame.Rect(text_x + button_width*2 + button_margin, button_section_y, button_width*2, button_height)
+
+        # Buy/Sell buttons
+        button_section_y += button_height + button_margin
+        buy_leaves_button_rect = pygame.Rect(text_x, button_section_y, button_width * 2, button_height)
+        sell_tea_button_rect = pygame.Rect(text_x + button_width * 2 + button_margin, button_section_y, button_width * 2, button_height)
+
+        window_rect = pygame.Rect(x, y, window_width, window_height)
+        return (window_rect, hire_button_rect, fire_button_rect, buy_leaves_button_rect, sell_tea_button_rect,
+                workers_box_rect, goods_box_rect)
+
+    def click_order_button(self, event, action):
+        if event.button == 1:
+            self.place_order(action)
+
+    def click_quantity_box(self, event, key):
+        if event.button == 1:
+            self.editing_quantity = key
+            self.quantity_text = ""
+
+    def place_order(self, action):
+        quantity = self.order_quantities["workers" if action in ("hire", "fire") else "goods"]
+        _, message = self.sim.execute_order(self.current_region, action, quantity)
+        self.sim.add_message(message)
+
+    def edit_quantity(self, event):
+        """Digits, Backspace, Enter to set the quantity and Escape to keep the previous one."""
+        if event.key in (pygame.K_RETURN, pygame.K_KP_ENTER):
+            self.finish_quantity_edit()
+        elif event.key == pygame.K_ESCAPE:
+            self.finish_quantity_edit(commit=False)
+        elif event.key == pygame.K_BACKSPACE:
+            self.quantity_text = self.quantity_text[:-1]
+        elif event.unicode.isdigit() and len(self.quantity_text) < MAX_ORDER_DIGITS:
+            self.quantity_text += event.unicode
+
+    def finish_quantity_edit(self, commit=True):
+        # An empty or zero quantity keeps the previous one
+        if commit and self.quantity_text and int(self.quantity_text) > 0:
+            self.order_quantities[self.editing_quantity] = int(self.quantity_text)
+        self.editing_quantity = None
+        self.quantity_text = ""
+
+    def draw_region_window(self, region_name):
+        region = self.sim.regions[region_name]
+        x, y, window_width, window_height = self.region_window_layout()[0]
+
         # Draw white background with border
         bg_surface = self.create_semi_transparent_surface(window_width, window_height)
         self.screen.blit(bg_surface, (x, y))
@@ -1034,305 +1563,111 @@ class Game:
         text_y = y + window_height * 0.05  # 5% margin from top
 
         # Region Name - Large font
-        region_name_text = self.font_large.render(f"Регион: {region_name}", True, text_color)
+        title = self.fit_text(self.font_large, f"Регион: {region_name}", window_width * 0.9)
+        region_name_text = self.render_text(self.font_large, title, text_color)
         self.screen.blit(region_name_text, (text_x, text_y))
         text_y += 50  # Larger spacing after title
 
         # Stats - Medium font with increased spacing
-        tea_cost_text = self.font_medium.render(f"Цена сырья: ${region.tea_leaves_cost:,.2f}", True, text_color)
+        tea_cost_text = self.render_text(self.font_medium, f"Цена сырья: ${region.tea_leaves_cost:,.2f}", text_color)
         self.screen.blit(tea_cost_text, (text_x, text_y))
         text_y += 40
 
-        labor_cost_text = self.font_medium.render(f"Заработная плата: ${region.labor_cost:,.2f}", True, text_color)
+        labor_cost_text = self.render_text(self.font_medium, f"Заработная плата: ${region.labor_cost:,.2f}", text_color)
         self.screen.blit(labor_cost_text, (text_x, text_y))
         text_y += 40
 
-        current_price_text = self.font_medium.render(f"Цена чая: ${region.current_tea_price:,.2f}", True, text_color)
+        current_price_text = self.render_text(self.font_medium, f"Цена чая: ${region.current_tea_price:,.2f}", text_color)
         self.screen.blit(current_price_text, (text_x, text_y))
         text_y += 40
 
         # Workers info - Small font with appropriate spacing
-        player_workers_text = self.font_small.render(f"Рабочие игрока: {region.get_worker_count(self.player.name)}", True, text_color)
+        player_workers_text = self.render_text(self.font_small, f"Рабочие игрока: {region.get_worker_count(self.sim.player.name)}", text_color)
         self.screen.blit(player_workers_text, (text_x, text_y))
         text_y += 30
 
-        for company in self.companies:
-            company_workers_text = self.font_small.render(f"Рабочие {company.name}: {region.get_worker_count(company.name)}", True, text_color)
+        companies, hidden = self.listed_companies(lambda company: region.get_worker_count(company.name))
+        for company in companies:
+            company_workers_text = self.render_text(self.font_small, f"Рабочие {company.name}: {region.get_worker_count(company.name)}", text_color)
             self.screen.blit(company_workers_text, (text_x, text_y))
             text_y += 30
+        if hidden:
+            more_text = self.render_text(self.font_small, f"... и ещё компаний: {hidden}", text_color)
+            self.screen.blit(more_text, (text_x, text_y))
+            text_y += 30
 
         # Tax Rate
         tax_rate = region.tax_rate
-        tax_rate_text = self.font_medium.render(f"Налоговая ставка: {tax_rate:.2f}", True, text_color)
+        tax_rate_text = self.render_text(self.font_medium, f"Налоговая ставка: {tax_rate:.2f}", text_color)
         self.screen.blit(tax_rate_text, (text_x, text_y))
         text_y += 40
 
-        # Buttons section at the bottom of the window
-        button_section_y = y + window_height - window_height * 0.25  # Start buttons 25% from bottom
-        button_width = int(window_width * 0.2)  # 20% of window width
-        button_height = int(window_height * 0.08)  # 8% of window height
-        button_margin = 20
+        # Order buttons and quantity fields, each from its own cached surface
+        for name in ("order_hire", "order_fire", "order_buy", "order_sell", "quantity_workers", "quantity_goods"):
+            self.widgets[name].draw(self.screen)
 
-        # Hire/Fire Buttons
-        hire_button_rect = pygame.Rect(text_x, button_section_y, button_width*2, button_height)
-        fire_button_rect = pygame.Rect(text_x + button_width*2 + button_margin, button_section_y, button_width*2, button_height)
-
-        pygame.draw.rect(self.screen, BLUE, hire_button_rect)
-        pygame.draw.rect(self.screen, BLUE, fire_button_rect)
-
-        hire_text = self.font_medium.render("Hire Worker", True, WHITE)
-        fire_text = self.font_medium.render("Fire Worker", True, WHITE)
-        self.screen.blit(hire_text, (hire_button_rect.centerx - hire_text.get_width()//2, hire_button_rect.centery - hire_text.get_height()//2))
-        self.screen.blit(fire_text, (fire_button_rect.centerx - fire_text.get_width()//2, fire_button_rect.centery - fire_text.get_height()//2))
-
-        # Buy/Sell buttons
-        button_section_y += button_height + button_margin
-        buy_leaves_button_rect = pygame.Rect(text_x, button_section_y, button_width * 2, button_height)
-        sell_tea_button_rect = pygame.Rect(text_x + button_width * 2 + button_margin, button_section_y, button_width * 2, button_height)
-
-        pygame.draw.rect(self.screen, BLUE, buy_leaves_button_rect)
-        pygame.draw.rect(self.screen, BLUE, sell_tea_button_rect)
-
-        buy_text = self.font_medium.render("Купить сырье", True, WHITE)
-        sell_text = self.font_medium.render("Продать чай", True, WHITE)
-        self.screen.blit(buy_text, (buy_leaves_button_rect.centerx - buy_text.get_width()//2, buy_leaves_button_rect.centery - buy_text.get_height()//2))
-        self.screen.blit(sell_text, (sell_tea_button_rect.centerx - sell_text.get_width()//2, sell_tea_button_rect.centery - sell_text.get_height()//2))
+    def render_order_button(self, widget, label):
+        surface = pygame.Surface(widget.rect.size).convert()
+        surface.fill(BLUE)
+        text = self.render_text(self.font_medium, label, WHITE)
+        surface.blit(text, (widget.rect.width // 2 - text.get_width() // 2, widget.rect.height // 2 - text.get_height() // 2))
+        return surface
 
-        # Check for button clicks inside the region window
-        if self.current_region:
-            if buy_leaves_button_rect.collidepoint(mouse_pos) and pygame.mouse.get_pressed()[0]:
-                self.buy_tea_leaves(region_name)
-            if sell_tea_button_rect.collidepoint(mouse_pos) and pygame.mouse.get_pressed()[0]:
-                self.sell_tea(region_name)
-            if hire_button_rect.collidepoint(mouse_pos) and pygame.mouse.get_pressed()[0]:
-                self.hire_worker(region_name)
-            if fire_button_rect.collidepoint(mouse_pos) and pygame.mouse.get_pressed()[0]:
-                self.fire_worker(region_name)
-
-    def buy_tea_leaves(self, region_name):
-        region = self.regions[region_name]
-        buy_amount = 100 # simplified, buying only 100 leaves
-        cost = region.tea_leaves_cost * buy_amount
-        if self.player.money >= cost:
-            self.player.money -= cost
-            self.player.tea_leaves += buy_amount  # Assuming green tea for simplicity
-            #self.add_message(f"Куплено {buy_amount} чайных листьев в {region_name} за ${cost:,.2f}")
-        #else:
-            #self.add_message("Недостаточно средств для покупки.")
-
-    def sell_tea(self, region_name):
-        region = self.regions[region_name]
-        sell_amount = 100  # simplified, selling only 100 tea
-        if self.player.processed_tea >= sell_amount:
-            self.player.processed_tea -= sell_amount
-            revenue = region.current_tea_price * sell_amount * (1 - region.tax_rate)
-            self.player.money += revenue
-            #self.add_message(f"Продано {sell_amount} чая в {region_name} за ${revenue:,.2f} (Налог: {region.tax_rate:.2f})")
-        #else:
-            #self.add_message("Недостаточно чая для продажи.")
-
-    def hire_worker(self, region_name):
-        region = self.regions[region_name]
-        self.player.hire_worker(region)
-            #self.add_message(f"Наняли рабочего в {region_name}.")
-        #else:
-            #self.add_message("Недостаточно средств для найма рабочих.")
-
-    def fire_worker(self, region_name):
-        region = self.regions[region_name]
-        self.player.fire_worker(region)
-            #self.add_message(f"Уволили рабочего в {region_name}.")
-        #else:
-            #self.add_message("Некого увольнять.")
-
-    def process_turn(self):
-        # 1. Update economic conditions in all regions
-        for region in self.regions.values():
-            region.update_economic_factors()
-        
-        # 2. Collect payments (workers' salaries)
-        for region_name, region in self.regions.items():
-            worker_cost = region.get_worker_count(self.player.name) * region.labor_cost
-            if self.player.money >= worker_cost:
-                self.player.money -= worker_cost
-                #self.add_message(f"Выплачено ${worker_cost:,.2f} рабочим в {region_name}")
-            else:
-                self.player.money = 0
-                self.add_message(f"Недостаточно средств на зарплаты в {region_name}! {region.get_worker_count(self.player.name)} уволились")
-                region.update_worker_count(self.player.name, 0)  # if can't pay, workers leave.
-                continue  # Skip further processing for this region
-
-        # 3. Harvesting
-        for region_name, region in self.regions.items():
-            raw_tea = region.harvest_tea(self.player, self.player.equipment_multiplier)
-            self.player.tea_leaves += raw_tea  # Assuming green tea for simplicity
-            #self.add_message(f"Harvested {raw_tea} raw Tea in {region_name}")
-
-        # 4. Packing
-        for region_name, region in self.regions.items():
-            packed_tea = region.pack_tea(self.player, self.player.tea_leaves, self.player.equipment_multiplier)
-            self.player.processed_tea += packed_tea
-            self.player.tea_leaves -= packed_tea  # Reduce raw tea by the amount packed
-            #self.add_message(f"Packed {packed_tea} Tea in {region_name}")
-        # 5. Taxes cut out
-        # 6. Random Events
-        self.trigger_random_event()
-
-        # 7. Competitor Actions (very basic)
-        self.competitor_turn()
-
-    def competitor_turn(self):
-        """Simulates actions for competitor companies."""
-        for company in self.companies:
-            # Companies now evaluate all regions and act in multiple regions per turn
-            profitable_regions = []
-            for region_name, region in self.regions.items():
-                # Calculate potential profit
-                profit = (region.current_tea_price - region.tea_leaves_cost) * 100 * company.aggressive_factor
-                if profit > 0:
-                    profitable_regions.append((profit, region))
-    
-            # Sort regions by profitability
-            #profitable_regions.sort(reverse=True)
-            profitable_regions.sort(key=lambda x: x[0], reverse=True)
-            # Act in top 3 most profitable regions
-            for _, region in profitable_regions:
-                # Harvesting with improved efficiency
-                raw_tea = region.harvest_tea(company, company.equipment_multiplier)
-                company.tea_leaves += raw_tea
-                # Packing with improved efficiency
-                packed_tea = region.pack_tea(company, company.tea_leaves, company.equipment_multiplier)
-                company.processed_tea += packed_tea
-                company.tea_leaves -= packed_tea
-
-            for _, region in profitable_regions[:3]:
-                # More aggressive selling
-                sell_amount = min(100 * int(company.aggressive_factor), company.processed_tea)
-                if sell_amount > 0:
-                    tax_rate = region.tax_rate
-                    revenue = region.current_tea_price * sell_amount * (1 - tax_rate)
-                company.money += revenue
-                company.processed_tea -= sell_amount
-
-            # Companies now evaluate all regions and act in multiple regions per turn
-            harvest_regions = []
-            for region_name, region in self.regions.items():
-                # Calculate potential benfit
-                hire = region.labor_cost * company.aggressive_factor
-                if hire > 0:
-                    harvest_regions.append((hire, region))
-            
-            #harvest_regions.sort()
-            harvest_regions.sort(key=lambda x: x[0], reverse=False)
-            # Hire workers in top 3 most profitable regions
-            for _, region in harvest_regions[:3]:
-                # Companies hire more aggressively
-                workers_to_hire = random.randint(1, 3)*2*int(company.aggressive_factor)  # Hire multiple workers at once
-                for _ in range(workers_to_hire):
-                    if company.hire_worker(region):
-                        continue
-                    else:
-                        break  # Stop if can't afford more workers
-
-            # Companies might upgrade their equipment (dummied out)
-            #if company.money > 5000 and random.random() < 0.2:  # 20% chance to upgrade if can afford
-            #    upgrade_cost = 5000
-            #    company.money -= upgrade_cost
-            #    company.equipment_multiplier *= 1.2  # 20% improvement
-
-    def trigger_random_event(self):
-        event_chance = random.random()
-        if event_chance < 0.1:  # 10% chance
-            event_type = random.randint(1, 5)
-            self.random_event(event_type)
-
-    def random_event(self, event_type):
-        if event_type == 1:  # Loss of tea due to spoilage
-            loss_percentage = random.uniform(0.1, 0.3)  # 10-30% loss
-            loss_amount = int(self.player.processed_tea * loss_percentage)
-            self.player.processed_tea -= loss_amount
-            self.add_message(f"Порча товара. Потеряно {loss_amount} чая.")
-
-            # Apply similar loss to competitors
-            for company in self.companies:
-                loss_amount_comp = int(company.processed_tea * loss_percentage)
-                company.processed_tea -= loss_amount_comp
-                self.add_message(f"Порча товара. {company.name} потеряла {loss_amount_comp} чая.")
-
-        elif event_type == 2:  # Labor strike
-            region_name = random.choice(list(self.regions.keys()))
-            region = self.regions[region_name]
-            workers_affected = int(region.get_worker_count(self.player.name) * 0.5)  # 50% of workers on strike
-            region.update_worker_count(self.player.name, -workers_affected)
-            self.add_message(f"Забастовка в {region.name}! {workers_affected} человек бастуют.")
-
-        elif event_type == 3:  # Market crash reduces company funds
-            loss_percentage = random.uniform(0.2, 0.6)  # 20-60% loss
-            loss_amount = int(self.player.money * loss_percentage)
-            self.player.money -= loss_amount
-            self.add_message(f"Обвал акций на фондовом рынке! Потеряно ${loss_amount:,.2f}.")
-
-            # Apply similar loss to competitors
-            for company in self.companies:
-                loss_amount_comp = int(company.money * loss_percentage)
-                company.money -= loss_amount_comp
-                self.add_message(f"{company.name} потеряла ${loss_amount_comp:,.2f} из-за обвала на фондовом рынке.")
-
-        elif event_type == 4:  # Unexpected demand increases tea prices
-            price_increase = random.uniform(1.1, 1.5)  # Random price increase factor
-            for region in self.regions.values():
-                region.current_tea_price *= price_increase
-            self.add_message("Неожиданный рост спроса на чай. Цены увеличились!")
-
-        elif event_type == 5:  # Pest outbreak reduces tea production
-            region_name = random.choice(list(self.regions.keys()))
-            region = self.regions[region_name]
-            production_loss = int(region.get_worker_count(self.player.name) * 0.3)  # 30% production loss
-            self.player.tea_leaves -= production_loss # lost tea leaves because of outbreak
-            self.add_message(f"Вредителями съедено {production_loss} чайных листьев.")
-
-    def add_message(self, message):
-        """Add a message to the message log."""
-        self.messages.append(message)
-        if len(self.messages) > 10:  # Limit the number of messages
-            self.messages.pop(0)
+    def render_quantity_box(self, widget, key, label):
+        """The field being typed in has a blue border and a cursor."""
+        editing = self.editing_quantity == key
+        value = self.quantity_text + "|" if editing else str(self.order_quantities[key])
+        surface = pygame.Surface(widget.rect.size).convert()
+        surface.fill(WHITE)
+        pygame.draw.rect(surface, BLUE if editing else BLACK, surface.get_rect(), 2)
+        text = self.render_text(self.font_small, f"{label}: {value}", BLACK)
+        surface.blit(text, (5, widget.rect.height // 2 - text.get_height() // 2))
+        return surface
 
-    def draw_game_log(self):
+    def draw_game_log_frame(self, surface):
         # Draw semi-transparent background
         bg_surface = self.create_semi_transparent_surface(self.game_log_rect.width, self.game_log_rect.height)
-        self.screen.blit(bg_surface, self.game_log_rect)
-        pygame.draw.rect(self.screen, BLACK, self.game_log_rect, 2)
+        surface.blit(bg_surface, self.game_log_rect)
+        pygame.draw.rect(surface, BLACK, self.game_log_rect, 2)
 
         # Draw title
-        title = self.font_medium.render("Game Log", True, BLACK)
+        title = self.render_text(self.font_medium, "Game Log", BLACK)
         title_x = self.game_log_rect.centerx - title.get_width() // 2
         title_y = self.game_log_rect.top + 5
-        self.screen.blit(title, (title_x, title_y))
+        surface.blit(title, (title_x, title_y))
+
+    def render_scroll_button(self, widget, arrow):
+        """Gray while there is something to scroll to in that direction."""
+        surface = pygame.Surface(widget.rect.size).convert()
+        surface.fill(GRAY if widget.state() else WHITE)
+        pygame.draw.rect(surface, BLACK, surface.get_rect(), 2)
+        arrow_text = self.render_text(self.font_medium, arrow, BLACK)
+        surface.blit(arrow_text, (widget.rect.width // 2 - arrow_text.get_width() // 2,
+                                  widget.rect.height // 2 - arrow_text.get_height() // 2))
+        return surface
 
+    def draw_game_log(self):
+        """Scroll buttons and messages; the frame is part of the static layer."""
         # Draw scroll buttons if there are more messages than can be displayed
-        if len(self.messages) > self.max_visible_messages:
-            # Up arrow
-            pygame.draw.rect(self.screen, GRAY if self.message_scroll_offset < len(self.messages) - self.max_visible_messages else WHITE, self.scroll_up_rect)
-            pygame.draw.rect(self.screen, BLACK, self.scroll_up_rect, 2)
-            up_arrow = self.font_medium.render("↑", True, BLACK)
-            self.screen.blit(up_arrow, (self.scroll_up_rect.centerx - up_arrow.get_width() // 2, 
-                                      self.scroll_up_rect.centery - up_arrow.get_height() // 2))
-
-            # Down arrow
-            pygame.draw.rect(self.screen, GRAY if self.message_scroll_offset > 0 else WHITE, self.scroll_down_rect)
-            pygame.draw.rect(self.screen, BLACK, self.scroll_down_rect, 2)
-            down_arrow = self.font_medium.render("↓", True, BLACK)
-            self.screen.blit(down_arrow, (self.scroll_down_rect.centerx - down_arrow.get_width() // 2,
-                                        self.scroll_down_rect.centery - down_arrow.get_height() // 2))
+        if len(self.sim.log) > self.max_visible_messages:
+            self.widgets["scroll_up"].draw(self.screen)
+            self.widgets["scroll_down"].draw(self.screen)
 
         # Calculate visible messages
         start_y = self.game_log_rect.top + 40  # Space for title
         message_height = 25  # Height per message
-        visible_messages = self.messages[-self.max_visible_messages - self.message_scroll_offset:] if self.message_scroll_offset > 0 else self.messages[-self.max_visible_messages:]
-        
+        visible_messages = self.sim.log.page(self.max_visible_messages, self.message_scroll_offset)
+
+        # Lines that scrolled out of the in-memory log will never be drawn again
+        oldest_seq = self.sim.log.total - len(self.sim.log)
+        if self.log_line_surfaces and min(self.log_line_surfaces) < oldest_seq:
+            self.log_line_surfaces = {seq: surface for seq, surface in self.log_line_surfaces.items() if seq >= oldest_seq}
+
         # Draw messages
-        for i, message in enumerate(visible_messages):
-            message_surface = self.font_small.render(message, True, BLACK)
+        for i, (seq, message) in enumerate(visible_messages):
+            message_surface = self.log_line_surfaces.get(seq)
+            if message_surface is None:
+                message_surface = self.log_line_surfaces[seq] = self.font_small.render(message, True, BLACK)
             message_x = self.game_log_rect.left + 10
             message_y = start_y + (i * message_height)
             
@@ -1340,25 +1675,33 @@ class Game:
             if message_y + message_height <= self.game_log_rect.bottom - 5:
                 self.screen.blit(message_surface, (message_x, message_y))
 
-    def draw_progress_window(self):
+    def draw_progress_frame(self, surface):
         # Draw semi-transparent background
         bg_surface = self.create_semi_transparent_surface(self.progress_rect.width, self.progress_rect.height)
-        self.screen.blit(bg_surface, self.progress_rect)
-        pygame.draw.rect(self.screen, BLACK, self.progress_rect, 2)
+        surface.blit(bg_surface, self.progress_rect)
+        pygame.draw.rect(surface, BLACK, self.progress_rect, 2)
 
         # Draw title
-        title = self.font_medium.render("Progress to Victory", True, BLACK)
+        title = self.render_text(self.font_medium, "Progress to Victory", BLACK)
         title_x = self.progress_rect.centerx - title.get_width() // 2
-        text_y = self.progress_rect.top + 20
-        self.screen.blit(title, (title_x, text_y))
-        text_y += 40
+        surface.blit(title, (title_x, self.progress_rect.top + 20))
+
+    def progress_panel_rect(self):
+        """Area draw_progress_window paints; on short screens the turn counter runs below the frame."""
+        rect = pygame.Rect(self.progress_rect)
+        rect.height = max(rect.height, 190 + self.font_medium.get_linesize())  # Offset of the turn counter line
+        return rect
+
+    def draw_progress_window(self):
+        """Progress bars and values; the frame is part of the static layer."""
+        text_y = self.progress_rect.top + 60
 
         # Calculate progress percentages
-        money_progress = (self.player.money / self.target_money) * 100
-        market_share = self.player.owned_tea_percentage * 100 if self.global_tea_supply > 0 else 0
+        money_progress = (self.sim.player.money / self.sim.target_money) * 100
+        market_share = self.sim.player.owned_tea_percentage * 100 if self.sim.global_tea_supply > 0 else 0
 
         # Draw money progress
-        money_text = self.font_medium.render(f"Деньги: ${self.player.money:,.0f} / ${self.target_money:,.0f}", True, BLACK)
+        money_text = self.render_text(self.font_medium, f"Деньги: ${self.sim.player.money:,.0f} / ${self.sim.target_money:,.0f}", BLACK)
         self.screen.blit(money_text, (self.progress_rect.left + 20, text_y))
         text_y += 25
 
@@ -1371,44 +1714,174 @@ class Game:
         text_y += 40
 
         # Draw market share progress
-        share_text = self.font_medium.render(f"Доля на рынке: {market_share:.1f}% / {self.monopoly_threshold*100}%", True, BLACK)
+        share_text = self.render_text(self.font_medium, f"Доля на рынке: {market_share:.1f}% / {self.sim.monopoly_threshold*100}%", BLACK)
         self.screen.blit(share_text, (self.progress_rect.left + 20, text_y))
         text_y += 25
 
         # Market share progress bar
-        share_progress = (market_share / (self.monopoly_threshold * 100)) * 100
+        share_progress = (market_share / (self.sim.monopoly_threshold * 100)) * 100
         progress_width = min(share_progress / 100 * bar_width, bar_width)
         pygame.draw.rect(self.screen, GRAY, (self.progress_rect.left + 20, text_y, bar_width, bar_height))
         pygame.draw.rect(self.screen, BLUE, (self.progress_rect.left + 20, text_y, progress_width, bar_height))
         text_y += 40
 
         # Draw turn count
-        turn_text = self.font_medium.render(f"Ход: {self.turn_count}", True, BLACK)
+        turn_text = self.render_text(self.font_medium, f"Ход: {self.sim.turn_count}", BLACK)
         self.screen.blit(turn_text, (self.progress_rect.left + 20, text_y))
         text_y += 30
 
         # Draw supply/demand info
-        #supply_text = self.font_small.render(f"Предложение: {self.global_tea_supply:.2f}", True, BLACK)
-        #demand_text = self.font_small.render(f"Спрос: {self.global_tea_demand}", True, BLACK)
+        #supply_text = self.render_text(self.font_small, f"Предложение: {self.sim.global_tea_supply:.2f}", BLACK)
+        #demand_text = self.render_text(self.font_small, f"Спрос: {self.sim.global_tea_demand}", BLACK)
         #self.screen.blit(supply_text, (self.progress_rect.left + 20, text_y))
         #self.screen.blit(demand_text, (self.progress_rect.left + 20, text_y + 20))
 
+    def render_text(self, font, text, color=BLACK, antialias=True):
+        """Render text through the shared surface cache. Do not draw on the result."""
+        return self.text_cache.render(font, text, color, antialias)
+
+    @staticmethod
+    def fit_text(font, text, width):
+        """`text`, cut short with "..." if it is wider than `width` pixels in `font`."""
+        if font.size(text)[0] <= width:
+            return text
+        while text and font.size(text + "...")[0] > width:
+            text = text[:-1]
+        return text.rstrip() + "..."
+
+    def get_font(self, size):
+        """Font of an arbitrary size, created once."""
+        font = self.fonts_by_size.get(size)
+        if font is None:
+            font = self.fonts_by_size[size] = pygame.font.Font(None, size)
+        return font
+
+    def toggle_perf_hud(self):
+        """Show or hide the performance HUD; frame timings go to PERF_CSV_PATH while it is shown."""
+        self.perf_hud = not self.perf_hud
+        if self.perf_hud:
+            self.perf_frames = 0
+            self.perf_window_start = time.perf_counter()
+            self.update_perf_stats(force=True)
+            try:
+                self.perf_csv = open(PERF_CSV_PATH, "a", newline="", encoding="utf-8")
+            except OSError as e:
+                print(f"Could not open {PERF_CSV_PATH}: {e}")
+                return
+            self.perf_csv_writer = csv.writer(self.perf_csv)
+            if self.perf_csv.tell() == 0:
+                self.perf_csv_writer.writerow(["time", "turn", "fps", "frame_ms"]
+                                              + [f"draw_{stage}_ms" for stage in DRAW_STAGES]
+                                              + [f"turn_{stage}_ms" for stage in TURN_STAGES])
+        else:
+            self.close_perf_csv()
+
+    def close_perf_csv(self):
+        if self.perf_csv:
+            self.perf_csv.close()
+        self.perf_csv = None
+        self.perf_csv_writer = None
+
+    def update_perf_stats(self, force=False):
+        """Refresh the numbers shown on the HUD every PERF_HUD_REFRESH_MS."""
+        now = time.perf_counter()
+        elapsed = now - self.perf_window_start
+        if not force and elapsed * 1000 < PERF_HUD_REFRESH_MS:
+            return
+        fps = self.perf_frames / elapsed if elapsed > 0 else 0.0
+        turn_timings = self.sim.turn_timer.timings
+        self.perf_stats = (
+            round(fps, 1),
+            round(self.last_frame_ms, 2),
+            tuple(round(self.last_draw_timings.get(stage, 0.0), 2) for stage in DRAW_STAGES),
+            tuple(round(turn_timings.get(stage, 0.0), 2) for stage in TURN_STAGES),
+            self.sim.turn_count,
+        )
+        self.perf_frames = 0
+        self.perf_window_start = now
+
+    def write_perf_row(self):
+        fps = self.perf_stats[0] if self.perf_stats else 0.0
+        turn_timings = self.sim.turn_timer.timings
+        self.perf_csv_writer.writerow(
+            [f"{time.time():.3f}", self.sim.turn_count, fps, f"{self.last_frame_ms:.3f}"]
+            + [f"{self.last_draw_timings.get(stage, 0.0):.3f}" for stage in DRAW_STAGES]
+            + [f"{turn_timings.get(stage, 0.0):.3f}" for stage in TURN_STAGES])
+
+    def perf_hud_rect(self):
+        """Bottom-left corner: FPS line on top, then draw and turn stages in two columns."""
+        line_height = self.font_small.get_linesize()
+        rows = 2 + max(len(DRAW_STAGES), len(TURN_STAGES))
+        width = min(self.screen_width, 2 * 200 + 10)
+        height = rows * line_height + 20
+        return pygame.Rect(0, self.screen_height - height, width, height)
+
+    def draw_perf_hud(self):
+        rect = self.perf_hud_rect()
+        self.screen.blit(self.create_semi_transparent_surface(rect.width, rect.height, 220), rect.topleft)
+        pygame.draw.rect(self.screen, BLACK, rect, 1)
+        if not self.perf_stats:
+            return
+        fps, frame_ms, draw_timings, turn_timings, turn = self.perf_stats
+        line_height = self.font_small.get_linesize()
+        x, y = rect.left + 10, rect.top + 10
+        self.screen.blit(self.render_text(self.font_small, f"FPS: {fps:.1f}   Кадр: {frame_ms:.2f} мс"), (x, y))
+        y += line_height
+
+        columns = [
+            ("Отрисовка, мс", DRAW_STAGES, draw_timings),
+            (f"Ход {turn}, мс", TURN_STAGES, turn_timings),
+        ]
+        for title, stages, timings in columns:
+            self.screen.blit(self.render_text(self.font_small, title, BLUE), (x, y))
+            for row, (stage, value) in enumerate(zip(stages, timings), 1):
+                text_y = y + row * line_height
+                self.screen.blit(self.render_text(self.font_small, stage), (x, text_y))
+                value_text = self.render_text(self.font_small, f"{value:.2f}")
+                self.screen.blit(value_text, (x + 180 - value_text.get_width(), text_y))
+            x += 200
+
     def create_semi_transparent_surface(self, width, height, alpha=150):
-        """Creates a semi-transparent white surface."""
-        surface = pygame.Surface((width, height))
-        surface.fill(WHITE)
-        surface.set_alpha(alpha)
+        """Returns a semi-transparent white surface, created once per size. Do not draw on it."""
+        key = (int(width), int(height), alpha)
+        surface = self.panel_surfaces.get(key)
+        if surface is None:
+            surface = pygame.Surface(key[:2])
+            surface.fill(WHITE)
+            surface.set_alpha(alpha)
+            self.panel_surfaces[key] = surface
         return surface
 
     def run(self):
+        idle = False
         while self.running:
-            self.handle_events()  # Process events
-            self.draw()           # Draw everything
-            self.clock.tick(60)   # Maintain 60 FPS
+            if idle and self.idle_mode:
+                # Nothing changed last frame: sleep until input arrives
+                event = pygame.event.wait(IDLE_WAIT_MS)
+                events = [event] + pygame.event.get() if event.type != pygame.NOEVENT else []
+                self.handle_events(events)
+            else:
+                self.handle_events()  # Process events
+
+            changed = self.draw()  # Draw whatever changed
+            idle = not changed
+            if not idle:
+                self.clock.tick(self.max_fps)  # Frame cap while active
+        self.close_perf_csv()
+        if self.allocation_tracker:
+            self.allocation_tracker.stop()
+            self.allocation_tracker.report()
+        self.sim.log.close()
         pygame.quit()
         sys.exit()
 
 # --- Main Execution ---
 if __name__ == "__main__":
-    game = Game()
+    world = REGIONS
+    if WORLD_PATH:
+        try:
+            world = load_world(WORLD_PATH)
+        except (OSError, ValueError) as e:
+            print(f"Could not load world {WORLD_PATH}: {e}")
+    game = Game(world=world)
     game.run()
@@ -0,0 +1,156 @@
+"""Monte Carlo balance runner.
+
+Plays many complete games of the Simulation turn logic with a scripted
+player on a process pool and reports win rates, turns-to-victory and which
+win/lose condition ended each game.
+
+    python balance.py --games 10000 --target-money 400000 --event-chance 0.15
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+
+import simulation
+
+MAX_TURNS = 200
+SALARY_RESERVE = 1.5  # Keep this many turns of salaries in cash before hiring more
+MAX_HIRES_PER_TURN = 10  # Roughly what a player clicks through in one turn
+
+
+def scripted_policy(sim):
+    """Sell packed tea where it pays most, then hire workers where labor is cheapest."""
+    player = sim.player
+    regions = list(sim.regions.values())
+
+    best_market = max(regions, key=lambda region: region.current_tea_price * (1 - region.tax_rate))
+    while player.processed_tea >= 100:
+        sim.sell_tea(best_market.name)
+
+    payroll = sum(region.get_worker_count(player.name) * region.labor_cost for region in regions)
+    cheapest = min(regions, key=lambda region: region.labor_cost)
+    for _ in range(MAX_HIRES_PER_TURN):
+        if player.money - cheapest.labor_cost <= (payroll + cheapest.labor_cost) * SALARY_RESERVE:
+            break
+        if not player.hire_worker(cheapest):
+            break
+        payroll += cheapest.labor_cost
+
+
+def play_game(seed, settings, max_turns=MAX_TURNS):
+    """Play one game to the end (or max_turns) and return its outcome."""
+    sim = simulation.Simulation(seed=seed, history=False, **settings)
+    while sim.turn_count < max_turns:
+        scripted_policy(sim)
+        if sim.next_turn():
+            break
+    return {
+        "winner": sim.winner,
+        "player_won": sim.winner == sim.player.name,
+        "reason": sim.end_reason or "unfinished",
+        "turns": sim.turn_count,
+    }
+
+
+def play_games(job):
+    """Process pool task: play a chunk of games."""
+    seeds, settings, max_turns = job
+    return [play_game(seed, settings, max_turns) for seed in seeds]
+
+
+def summarize(results):
+    games = len(results)
+    reasons = Counter(result["reason"] for result in results)
+    victories = sorted(result["turns"] for result in results if result["player_won"])
+    summary = {
+        "games": games,
+        "player_win_rate": len(victories) / games if games else 0.0,
+        "competitor_win_rate": (reasons["competitor_money"] + reasons["competitor_share"]) / games if games else 0.0,
+        "reasons": dict(reasons),
+        "turns_to_victory": None,
+    }
+    if victories:
+        summary["turns_to_victory"] = {
+            "mean": statistics.fmean(victories),
+            "median": statistics.median(victories),
+            "p90": victories[int(0.9 * (len(victories) - 1))],
+            "min": victories[0],
+            "max": victories[-1],
+        }
+    return summary
+
+
+def run(games, settings, workers=None, seed=0, max_turns=MAX_TURNS):
+    """Play `games` games across a process pool and return the aggregated summary."""
+    workers = workers or os.cpu_count() or 1
+    seeds = list(range(seed, seed + games))
+    # A few chunks per worker keeps every core busy without paying IPC per game
+    chunk_size = max(1, games // (workers * 4))
+    jobs = [(seeds[i:i + chunk_size], settings, max_turns) for i in range(0, games, chunk_size)]
+
+    results = []
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for chunk in pool.map(play_games, jobs):
+            results.extend(chunk)
+    return summarize(results)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Play many Tea Empire games and report balance statistics.")
+    parser.add_argument("--games", type=int, default=1000)
+    parser.add_argument("--workers", type=int, default=None, help="processes to use (default: all cores)")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the first game")
+    parser.add_argument("--max-turns", type=int, default=MAX_TURNS)
+    parser.add_argument("--target-money", type=float, default=simulation.TARGET_MONEY)
+    parser.add_argument("--monopoly-threshold", type=float, default=simulation.MONOPOLY_THRESHOLD)
+    parser.add_argument("--event-chance", type=float, default=simulation.RANDOM_EVENT_CHANCE)
+    parser.add_argument("--money-multiplier", type=float, nargs=2, default=simulation.COMPANY_MONEY_MULTIPLIER,
+                        metavar=("MIN", "MAX"))
+    parser.add_argument("--tea-multiplier", type=float, nargs=2, default=simulation.COMPANY_TEA_MULTIPLIER,
+                        metavar=("MIN", "MAX"))
+    parser.add_argument("--companies", type=int, default=simulation.COMPANY_COUNT, help="number of competitors")
+    parser.add_argument("--vectorized", action="store_true",
+                        help="use the NumPy region economy (faster from about 100 regions)")
+    parser.add_argument("--market-clearing", action="store_true", help="sell through per-region cleared markets")
+    parser.add_argument("--world", help="JSON world file to play on instead of the built-in regions")
+    parser.add_argument("--json", help="also write the summary to this file")
+    args = parser.parse_args(argv)
+
+    settings = {
+        "vectorized": args.vectorized,
+        "target_money": args.target_money,
+        "monopoly_threshold": args.monopoly_threshold,
+        "event_chance": args.event_chance,
+        "money_multiplier": tuple(args.money_multiplier),
+        "tea_multiplier": tuple(args.tea_multiplier),
+        "company_count": args.companies,
+        "market_clearing": args.market_clearing,
+    }
+    if args.world:
+        try:
+            settings["regions"] = simulation.load_world(args.world)
+        except (OSError, ValueError) as e:
+            parser.error(f"could not load world {args.world}: {e}")
+    summary = run(args.games, settings, workers=args.workers, seed=args.seed, max_turns=args.max_turns)
+    summary["settings"] = settings
+
+    print(f"Games: {summary['games']}")
+    print(f"Player win rate: {summary['player_win_rate']:.1%}")
+    print(f"Competitor win rate: {summary['competitor_win_rate']:.1%}")
+    for reason, count in sorted(summary["reasons"].items(), key=lambda item: -item[1]):
+        print(f"  {reason}: {count}")
+    if summary["turns_to_victory"]:
+        turns = summary["turns_to_victory"]
+        print(f"Turns to victory: mean {turns['mean']:.1f}, median {turns['median']}, p90 {turns['p90']}")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(summary, f, ensure_ascii=False, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
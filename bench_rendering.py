@@ -0,0 +1,182 @@
+"""Headless frame-time benchmark for Game.draw and its drawing stages.
+
+Runs under the dummy SDL video driver at several resolutions, reports
+p50/p95/p99 times and the Python memory allocated per frame, and fails
+when a stage's p95 goes over its budget in render_budgets.json:
+
+    python bench_rendering.py --resolutions 1280x720 1920x1080
+    python bench_rendering.py --budgets render_budgets.json --save frames.json
+"""
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+import tracemalloc
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("PYGAME_HIDE_SUPPORT_PROMPT", "1")
+
+import pygame
+
+import TEAPOT6
+
+SEED = 1234
+FRAMES = 200
+WARMUP_FRAMES = 10
+TURNS = 5  # Played before measuring so the log, progress and prices are not empty
+RESOLUTIONS = ["1024x600", "1280x720", "1920x1080"]
+BUDGETS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "render_budgets.json")
+
+
+def full_frame(game):
+    """A complete redraw and present, as after a resize or a modal change."""
+    game.full_redraw_needed = True
+    game.draw()
+
+
+STAGES = {
+    "draw": full_frame,
+    "draw_idle": lambda game: game.draw(),  # Nothing changed: the dirty-rect path should be almost free
+    "draw_resources": lambda game: game.draw_resources(),
+    "draw_map": lambda game: game.draw_map(),
+    "draw_game_log": lambda game: game.draw_game_log(),
+    "draw_progress_window": lambda game: game.draw_progress_window(),
+    "draw_region_window": lambda game: game.draw_region_window(game.current_region),
+    "show_help": lambda game: game.show_help(),
+    "show_win_conditions": lambda game: game.show_win_conditions(),
+    "show_market_information": lambda game: game.show_market_information(),
+    "draw_market_charts": lambda game: game.draw_market_charts(),  # Cached charts, nothing new to draw
+}
+
+
+def parse_resolution(text):
+    width, _, height = text.lower().partition("x")
+    return int(width), int(height)
+
+
+def make_game(size):
+    """A seeded game a few turns in, with a region window open and no modal."""
+    game = TEAPOT6.Game(seed=SEED, screen_size=size, log_path=None)
+    for _ in range(TURNS):
+        game.sim.next_turn()
+    game.modal = None
+    game.current_region = game.region_names[0]
+    return game
+
+
+def percentile(sorted_values, fraction):
+    return sorted_values[min(len(sorted_values) - 1, int(fraction * len(sorted_values)))]
+
+
+def measure(game, operation, frames=FRAMES):
+    """Per-frame milliseconds, then a second traced pass for the KiB allocated per frame."""
+    for _ in range(WARMUP_FRAMES):
+        operation(game)
+
+    timings = []
+    for _ in range(frames):
+        start = time.perf_counter()
+        operation(game)
+        timings.append((time.perf_counter() - start) * 1000)
+
+    # tracemalloc slows everything down, so allocations get a pass of their own.
+    # Only Python-side memory is seen: SDL pixel buffers are allocated outside of it.
+    allocated = []
+    tracemalloc.start()
+    try:
+        for _ in range(frames):
+            tracemalloc.reset_peak()
+            before = tracemalloc.get_traced_memory()[0]
+            operation(game)
+            allocated.append((tracemalloc.get_traced_memory()[1] - before) / 1024)
+    finally:
+        tracemalloc.stop()
+
+    timings.sort()
+    return {
+        "p50_ms": percentile(timings, 0.50),
+        "p95_ms": percentile(timings, 0.95),
+        "p99_ms": percentile(timings, 0.99),
+        "max_ms": timings[-1],
+        "alloc_kib": sum(allocated) / len(allocated),
+    }
+
+
+def run(names, resolutions, frames=FRAMES):
+    results = {}
+    for resolution in resolutions:
+        game = make_game(parse_resolution(resolution))
+        for name in names:
+            case = f"{name}[{resolution}]"
+            result = measure(game, STAGES[name], frames)
+            results[case] = dict(stage=name, resolution=resolution, **result)
+            print(f"{case:40} p50 {result['p50_ms']:8.3f}  p95 {result['p95_ms']:8.3f}  "
+                  f"p99 {result['p99_ms']:8.3f} ms  {result['alloc_kib']:9.1f} KiB/frame")
+        game.sim.log.close()
+    pygame.quit()
+    return results
+
+
+def check_budgets(results, budgets):
+    """Returns the cases whose p95 is over budget; per-resolution budgets override the defaults."""
+    over = []
+    for case, result in results.items():
+        budget = budgets.get(result["resolution"], {}).get(result["stage"],
+                                                           budgets.get("default", {}).get(result["stage"]))
+        if budget is None:
+            continue
+        if result["p95_ms"] > budget:
+            over.append(case)
+            print(f"{case:40} p95 {result['p95_ms']:8.3f} ms over budget of {budget:.3f} ms")
+    return over
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark Tea Empire rendering under the dummy video driver.")
+    parser.add_argument("stages", nargs="*", help=f"stages to run (default: all of {', '.join(STAGES)})")
+    parser.add_argument("--resolutions", nargs="+", default=RESOLUTIONS, help="WIDTHxHEIGHT screen sizes")
+    parser.add_argument("--frames", type=int, default=FRAMES)
+    parser.add_argument("--budgets", default=BUDGETS_PATH, help="JSON file with p95 budgets in milliseconds")
+    parser.add_argument("--no-budgets", action="store_true", help="only report, never fail")
+    parser.add_argument("--save", help="write the results to this JSON file")
+    args = parser.parse_args(argv)
+    unknown = set(args.stages) - set(STAGES)
+    if unknown:
+        parser.error(f"unknown stage(s): {', '.join(sorted(unknown))}")
+    try:
+        for resolution in args.resolutions:
+            parse_resolution(resolution)
+    except ValueError:
+        parser.error(f"resolutions must look like 1280x720, got {resolution!r}")
+
+    results = run(args.stages or list(STAGES), args.resolutions, args.frames)
+    if args.save:
+        report = {
+            "meta": {
+                "python": platform.python_version(),
+                "platform": platform.platform(),
+                "pygame": pygame.version.ver,
+                "video_driver": os.environ["SDL_VIDEODRIVER"],
+                "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            },
+            "results": results,
+        }
+        with open(args.save, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+    if not args.no_budgets:
+        with open(args.budgets, encoding="utf-8") as f:
+            budgets = json.load(f)
+        print()
+        over = check_budgets(results, budgets)
+        if over:
+            print(f"\n{len(over)} stage(s) over budget")
+            return 1
+        print("All stages within budget")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,189 @@
+"""Microbenchmarks for the hot paths of the simulation turn pipeline.
+
+Every benchmark runs on freshly built, seeded worlds of several sizes
+(regions x companies x workers per region). Results are written as JSON
+and can be compared with a stored baseline:
+
+    python bench_simulation.py --save baseline.json
+    python bench_simulation.py --compare baseline.json --tolerance 0.2
+"""
+import argparse
+import itertools
+import json
+import platform
+import statistics
+import sys
+import time
+
+import simulation
+
+SEED = 1234
+REPEAT = 5
+CALLS = 10  # Calls per repeat, the same every run so every repeat times the same game states
+
+
+def synthetic_world(region_count):
+    """`region_count` regions cycling through the stock REGIONS data."""
+    stock = list(simulation.REGIONS.items())
+    world = {}
+    for i in range(region_count):
+        name, data = stock[i % len(stock)]
+        world[name if i < len(stock) else f"{name} {i // len(stock)}"] = data
+    return world
+
+
+def make_simulation(regions, companies, workers, vectorized=False, market_clearing=False):
+    sim = simulation.Simulation(seed=SEED, regions=synthetic_world(regions), company_count=companies,
+                             vectorized=vectorized, market_clearing=market_clearing, history=False)
+    sim.player.money = 10**12  # Enough for every salary, so no turn times unpaid-worker messages instead
+    agents = [sim.player.name] + [company.name for company in sim.companies]
+    for region in sim.regions.values():
+        for name in agents:
+            region.update_worker_count(name, workers)
+        for company in sim.companies:
+            company.add_influence(region, 1.0)
+    return sim
+
+
+def random_events(sim):
+    for event_type in range(1, 6):
+        sim.random_event(event_type)
+
+
+def update_regions(sim):
+    for region in sim.regions.values():
+        region.update_economic_factors()
+
+
+def clear_market(sim):
+    """Every company sells into three regions, then all markets clear at once."""
+    if sim.market is None:
+        sim.market = sim.make_market()
+    region_count = len(sim.regions)
+    for seller in range(1, len(sim.companies) + 1):
+        for i in range(3):
+            sim.market.submit(seller, (seller * 7 + i * 13) % region_count, 100.0)
+    sim.clear_market()
+
+
+def save_load(sim):
+    simulation.Simulation.from_bytes(sim.to_bytes())
+
+
+def check_conditions(sim):
+    sim.check_win_condition()
+    sim.check_lose_condition()
+
+
+BENCHMARKS = {
+    "process_turn": lambda sim: sim.process_turn(),
+    "competitor_turn": lambda sim: sim.competitor_turn(),
+    "update_market_prices": lambda sim: sim.update_market_prices(),
+    "clear_market": clear_market,
+    "save_load": save_load,
+    "check_win_lose": check_conditions,
+    "region_update_economic_factors": update_regions,
+    "random_event": random_events,
+}
+
+
+def measure(make, operation, repeat=REPEAT, calls=CALLS):
+    """Seconds per call: every repeat starts from a fresh world and makes the same number of calls."""
+    timings = []
+    for _ in range(repeat):
+        sim = make()
+        start = time.perf_counter()
+        for _ in range(calls):
+            operation(sim)
+        timings.append((time.perf_counter() - start) / calls)
+    return timings
+
+
+def run(names, region_counts, company_counts, worker_counts, vectorized=False, repeat=REPEAT, calls=CALLS,
+        market_clearing=False):
+    results = {}
+    for name in names:
+        for regions, companies, workers in itertools.product(region_counts, company_counts, worker_counts):
+            case = (f"{name}[r={regions},c={companies},w={workers}{',numpy' if vectorized else ''}"
+                    f"{',market' if market_clearing else ''}]")
+            timings = measure(lambda: make_simulation(regions, companies, workers, vectorized, market_clearing),
+                              BENCHMARKS[name], repeat, calls)
+            results[case] = {
+                "benchmark": name,
+                "regions": regions,
+                "companies": companies,
+                "workers": workers,
+                "vectorized": vectorized,
+                "market_clearing": market_clearing,
+                "median_us": statistics.median(timings) * 1e6,
+                "min_us": min(timings) * 1e6,
+            }
+            print(f"{case:60} {results[case]['median_us']:12.1f} us")
+    return results
+
+
+def compare(results, baseline, tolerance):
+    """Print current/baseline ratios; returns the cases slower than the tolerance allows."""
+    regressions = []
+    for case, result in results.items():
+        old = baseline.get("results", {}).get(case)
+        if not old:
+            continue
+        ratio = result["median_us"] / old["median_us"]
+        flag = ""
+        if ratio > 1 + tolerance:
+            flag = "  REGRESSION"
+            regressions.append(case)
+        elif ratio < 1 - tolerance:
+            flag = "  faster"
+        print(f"{case:60} {old['median_us']:12.1f} -> {result['median_us']:12.1f} us  x{ratio:.2f}{flag}")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the simulation turn pipeline.")
+    parser.add_argument("benchmarks", nargs="*", help=f"benchmarks to run (default: all of {', '.join(BENCHMARKS)})")
+    parser.add_argument("--regions", type=int, nargs="+", default=[10, 100, 1000])
+    parser.add_argument("--companies", type=int, nargs="+", default=[3, 30])
+    parser.add_argument("--workers", type=int, nargs="+", default=[10])
+    parser.add_argument("--vectorized", action="store_true",
+                        help="use the NumPy region economy (faster from about 100 regions)")
+    parser.add_argument("--market-clearing", action="store_true", help="sell through per-region cleared markets")
+    parser.add_argument("--repeat", type=int, default=REPEAT)
+    parser.add_argument("--calls", type=int, default=CALLS, help="calls per repeat")
+    parser.add_argument("--save", help="write the results to this JSON file")
+    parser.add_argument("--compare", help="baseline JSON file to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed slowdown before failing (0.2 = 20%%)")
+    args = parser.parse_args(argv)
+    unknown = set(args.benchmarks) - set(BENCHMARKS)
+    if unknown:
+        parser.error(f"unknown benchmark(s): {', '.join(sorted(unknown))}")
+
+    results = run(args.benchmarks or list(BENCHMARKS), args.regions, args.companies, args.workers,
+                  args.vectorized, args.repeat, args.calls, args.market_clearing)
+    report = {
+        "meta": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "numpy": getattr(simulation.np, "__version__", None),
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        },
+        "results": results,
+    }
+    if args.save:
+        with open(args.save, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)
+        print()
+        regressions = compare(results, baseline, args.tolerance)
+        if regressions:
+            print(f"\n{len(regressions)} benchmark(s) slower than the baseline by more than {args.tolerance:.0%}")
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,1553 @@
+"""Tea Empire simulation: regions, companies, the turn pipeline and save games.
+
+Runs without pygame, so balance runs and benchmarks can step thousands of
+turns without a display. TEAPOT6.py draws it and handles the input.
+"""
+import random
+import sys
+import os
+import time
+import json
+import math
+import gc
+import tracemalloc
+import struct
+import zlib
+import heapq
+from array import array
+from collections import deque
+from itertools import islice
+
+try:
+    import numpy as np
+except ImportError:  # NumPy is optional, only the vectorized economy needs it
+    np = None
+
+# --- Constants ---
+
+# Game balance
+TARGET_MONEY = 500000
+MONOPOLY_THRESHOLD = 0.6  # 60% market share requirement
+MIN_TURNS_TO_WIN = 7
+RANDOM_EVENT_CHANCE = 0.1  # 10% chance per turn
+COMPANY_COUNT = 3
+COMPANY_MONEY_MULTIPLIER = (2.0, 3.0)  # 2-3x more starting money
+COMPANY_TEA_MULTIPLIER = (1.5, 2.0)  # 1.5-2x more starting tea
+ORDER_ACTIONS = ("buy", "sell", "hire", "fire")  # Player orders: tea leaves, packed tea, workers
+
+# Vectorized mode (Simulation option): region economies are NumPy arrays
+LOCKSTEP_MIN_COMPANIES = 16  # Fewer competitors pack tea in a float loop per company
+
+# Market clearing (Simulation option): tea is sold through per-region markets cleared once per turn
+MARKET_ELASTICITY = 2.0  # Demand grows 2% for every 1% the price drops
+
+# Game log
+LOG_WINDOW_SIZE = 200  # Messages kept in memory (and scrollable in the UI)
+
+# History recorded every turn: region metrics as float32, agent metrics as float64
+REGION_HISTORY_METRICS = ("current_tea_price", "tea_leaves_cost", "labor_cost", "economic_stability",
+                          "labor_market_pressure", "agricultural_conditions", "market_development")
+AGENT_HISTORY_METRICS = ("money", "owned_tea_percentage")
+
+# Save games
+SNAPSHOT_MAGIC = b"TEAS"
+SNAPSHOT_VERSION = 3  # 2 added the market clearing section, 3 the history; older saves still load
+
+# Turn stages timed by Simulation.turn_timer
+TURN_STAGES = ("economy", "salaries", "harvest", "pack", "events", "competitors", "market_prices", "history")
+
+# World definition
+WORLD_REGION_FIELDS = ("tea_leaves_cost", "labor_cost", "tax_rate", "potential_tea")  # Required for every region
+
+# Region Information
+REGIONS = {
+    "Индонезия": {"tea_leaves_cost": 5.0, "labor_cost": 250, "tax_rate": 0.1, "potential_tea": 500, "icon": "indonesia.png"},
+    "Индия": {"tea_leaves_cost": 6.0, "labor_cost": 300, "tax_rate": 0.12, "potential_tea": 600, "icon": "india.png"},
+    "Китай": {"tea_leaves_cost": 7.5, "labor_cost": 325, "tax_rate": 0.15, "potential_tea": 700, "icon": "china.png"},
+    "Турция": {"tea_leaves_cost": 6.5, "labor_cost": 310, "tax_rate": 0.13, "potential_tea": 550, "icon": "turkey.png"},
+    "Кения": {"tea_leaves_cost": 4.0, "labor_cost": 200, "tax_rate": 0.08, "potential_tea": 450, "icon": "kenya.png"},
+    "Германия": {"tea_leaves_cost": 10.0, "labor_cost": 400, "tax_rate": 0.20, "potential_tea": 800, "icon": "germany.png"},
+    "Россия": {"tea_leaves_cost": 8.5, "labor_cost": 380, "tax_rate": 0.17, "potential_tea": 750, "icon": "russia.png"},
+    "США": {"tea_leaves_cost": 12.5, "labor_cost": 450, "tax_rate": 0.25, "potential_tea": 700, "icon": "usa.png"},
+    "Аргентина": {"tea_leaves_cost": 5.5, "labor_cost": 275, "tax_rate": 0.11, "potential_tea": 650, "icon": "argentina.png"},
+    "Австралия": {"tea_leaves_cost": 9.0, "labor_cost": 425, "tax_rate": 0.18, "potential_tea": 850, "icon": "australia.png"},
+}
+
+def load_world(path):
+    """Regions of a world file, in the same shape as REGIONS.
+
+    The file is JSON: {"regions": {"<name>": {"tea_leaves_cost": ..., "labor_cost": ...,
+    "tax_rate": ..., "potential_tea": ..., "icon": "<optional file in img/>"}, ...}}.
+    Costs cannot be negative, tax_rate is a fraction between 0 and 1 and
+    potential_tea is positive.
+    Regions keep the order they have in the file.
+    """
+    with open(path, encoding="utf-8") as f:
+        world = json.load(f)
+    regions = world.get("regions") if isinstance(world, dict) else None
+    if not isinstance(regions, dict) or not regions:
+        raise ValueError(f"{path}: expected a non-empty \"regions\" object")
+    for name, data in regions.items():
+        if not isinstance(data, dict):
+            raise ValueError(f"{path}: region {name!r} is not an object")
+        for field in WORLD_REGION_FIELDS:
+            value = data.get(field)
+            if isinstance(value, bool) or not isinstance(value, (int, float)) or not math.isfinite(value):
+                raise ValueError(f"{path}: region {name!r} needs a number for {field!r}")
+        for field in ("tea_leaves_cost", "labor_cost"):
+            if data[field] < 0:
+                raise ValueError(f"{path}: region {name!r} cannot have a negative {field!r}")
+        if not 0 <= data["tax_rate"] <= 1:
+            raise ValueError(f"{path}: region {name!r} needs a 'tax_rate' between 0 and 1")
+        if data["potential_tea"] <= 0:
+            raise ValueError(f"{path}: region {name!r} needs a positive 'potential_tea'")
+        if not isinstance(data.get("icon", ""), str):
+            raise ValueError(f"{path}: icon of region {name!r} must be a file name")
+    return regions
+
+# --- Classes ---
+def affordable_workers(money, labor_cost, required, count):
+    """How many of `count` workers are hired one at a time, paying labor_cost each,
+    while at least `required` money is left before every hire. Closed form of that loop."""
+    if count <= 0 or money < required:
+        return 0
+    if labor_cost <= 0:
+        return count
+    hired = min(count, int((money - required) // labor_cost) + 1)
+    # The division may round either way; settle the boundary with the loop's own comparison
+    while hired > 0 and money - (hired - 1) * labor_cost < required:
+        hired -= 1
+    while hired < count and money - hired * labor_cost >= required:
+        hired += 1
+    return hired
+
+class WorkerMatrix:
+    """Worker counts of every agent (player and companies) in every region.
+
+    One row per agent and one column per region: a NumPy int64 array in
+    vectorized simulations, nested lists otherwise. Agents get a row the
+    first time they hire. `active` keeps, per row, the columns with workers
+    so sparse passes over a large world do not scan every region, and
+    `version` changes with every count, so views can tell when to redraw.
+    """
+    def __init__(self, region_count=1, agents=(), vectorized=False):
+        self.region_count = region_count
+        self.vectorized = vectorized
+        agents = list(dict.fromkeys(agents))
+        self.rows = {name: row for row, name in enumerate(agents)}  # Agent name : row
+        # The starting agents are allocated at once, later ones grow the matrix a row at a time
+        if vectorized:
+            self.counts = np.zeros((len(agents), region_count), dtype=np.int64)
+        else:
+            self.counts = [[0] * region_count for _ in agents]
+        self.active = [set() for _ in agents]  # Row : set of columns with a non-zero count
+        self.version = 0
+
+    def add_agent(self, name):
+        row = self.rows.get(name)
+        if row is None:
+            row = self.rows[name] = len(self.rows)
+            if self.vectorized:
+                self.counts = np.vstack([self.counts, np.zeros((1, self.region_count), dtype=np.int64)])
+            else:
+                self.counts.append([0] * self.region_count)
+            self.active.append(set())
+        return row
+
+    def get(self, name, column):
+        row = self.rows.get(name)
+        return 0 if row is None else int(self.counts[row][column])
+
+    def add(self, name, column, count):
+        row = self.add_agent(name)
+        counts = self.counts[row]
+        counts[column] += count
+        if count:
+            self.version += 1
+        if counts[column]:
+            self.active[row].add(column)
+        else:
+            self.active[row].discard(column)
+
+    def column(self, column):
+        """{agent name: workers} in one region."""
+        return {name: int(self.counts[row][column]) for name, row in self.rows.items()}
+
+class Player:
+    def __init__(self):
+        self.name = "Player"
+        self.money = 5000
+        self.tea_leaves = 0
+        self.processed_tea = 0
+        self.equipment_multiplier = 1.0
+        self.owned_tea_percentage = 0
+
+    def hire_worker(self, region):
+        return self.hire_workers(region, 1) == 1
+
+    def hire_workers(self, region, count):
+        """Hire up to `count` workers, each only if the full salary is in cash. Returns how many were hired."""
+        labor_cost = region.labor_cost
+        hired = affordable_workers(self.money, labor_cost, labor_cost, count)
+        if hired:
+            self.money -= hired * labor_cost
+            region.update_worker_count(self.name, hired)
+        return hired
+
+    def fire_worker(self, region):
+        return self.fire_workers(region, 1) == 1
+
+    def fire_workers(self, region, count):
+        """Fire up to `count` workers. Returns how many were fired."""
+        fired = max(0, min(count, region.get_worker_count(self.name)))
+        if fired:
+            region.update_worker_count(self.name, -fired)
+        return fired
+
+    def get_total_tea(self):
+        return self.tea_leaves + self.processed_tea
+
+class Company:
+    def __init__(self, name, money_multiplier=1.0, tea_multiplier=1.0, rng=random):
+        self.name = name
+        # Increased starting resources based on multipliers
+        self.money = rng.randint(5000, 15000) * money_multiplier
+        self.influence = {} # Region : Influence
+        self.tea_leaves = rng.randint(100, 300) * tea_multiplier
+        self.processed_tea = rng.randint(50, 150) * tea_multiplier
+        self.workers = {}  # region: number_of_workers
+        self.equipment_multiplier = rng.uniform(1.2, 1.5)  # Companies start with better equipment
+        self.owned_tea_percentage = 0
+        self.aggressive_factor = rng.uniform(1.5, 3.0)  # Companies are more aggressive in trading
+
+    def add_influence(self, region, amount):
+        if region not in self.influence:
+            self.influence[region] = 0
+        self.influence[region] = max(0, self.influence.get(region, 0) + amount)  # Ensure influence doesn't go below 0
+
+    def get_total_tea(self):
+        return self.processed_tea
+
+    def hire_worker(self, region):
+        """Hire a worker in the specified region."""
+        return self.hire_workers(region, 1) == 1
+
+    def hire_workers(self, region, count):
+        """Hire up to `count` workers in the region. Returns how many were hired."""
+        # Companies are willing to spend more on workers: they hire with 80% of a salary in cash
+        labor_cost = region.labor_cost
+        hired = affordable_workers(self.money, labor_cost, labor_cost * 0.8, count)
+        if hired:
+            self.money -= hired * labor_cost
+            region.update_worker_count(self.name, hired)
+        return hired
+
+    def fire_worker(self, region):
+        """Fire a worker in the specified region."""
+        return self.fire_workers(region, 1) == 1
+
+    def fire_workers(self, region, count):
+        """Fire up to `count` workers in the region. Returns how many were fired."""
+        fired = max(0, min(count, region.get_worker_count(self.name)))
+        if fired:
+            region.update_worker_count(self.name, -fired)
+        return fired
+
+
+class Region:
+    def __init__(self, name, data, rng=random, workforce=None, column=0):
+        self.name = name
+        self.rng = rng  # Source of the region's economic randomness
+        self.base_tea_leaves_cost = data["tea_leaves_cost"]
+        self.base_labor_cost = data["labor_cost"]
+        self.tax_rate = data["tax_rate"]
+        self.potential_tea = data["potential_tea"]
+        # Worker counts live in the simulation-wide matrix, in this region's column
+        self.workforce = workforce if workforce is not None else WorkerMatrix()
+        self.column = column
+        self.current_tea_price = 7  # Initial price
+        
+        # Economic factors
+        self.economic_stability = self.rng.uniform(0.5, 1.5)  # Economic stability multiplier
+        self.labor_market_pressure = self.rng.uniform(0.5, 1.5)  # Labor market pressure
+        self.agricultural_conditions = self.rng.uniform(0.8, 1.2)  # Agricultural conditions
+        self.market_development = self.rng.uniform(0.8, 1.2)  # Market development level
+        
+        # Current costs (will be updated each turn)
+        self.tea_leaves_cost = self.base_tea_leaves_cost * self.rng.uniform(0.8, 1.2)
+        self.labor_cost = self.base_labor_cost * self.rng.uniform(0.8, 1.2)
+        
+        # Price ranges based on region's economic factors
+        self.min_price = self.tea_leaves_cost * 5  # Minimum price is 5x the tea leaves cost
+        self.max_price = self.tea_leaves_cost * 15  # Maximum price is 15x the tea leaves cost
+        
+    def update_economic_factors(self):
+        """Update economic factors each turn."""
+        # Randomly adjust economic factors with small variations
+        self.economic_stability *= self.rng.uniform(0.95, 1.05)  # ±5% change
+        self.labor_market_pressure *= self.rng.uniform(0.93, 1.07)  # ±7% change
+        self.agricultural_conditions *= self.rng.uniform(0.9, 1.1)  # ±10% change
+        self.market_development *= self.rng.uniform(0.95, 1.05)  # ±5% change
+        
+        # Keep factors within reasonable bounds
+        self.economic_stability = max(0.6, min(1.4, self.economic_stability))
+        self.labor_market_pressure = max(0.7, min(1.3, self.labor_market_pressure))
+        self.agricultural_conditions = max(0.5, min(1.5, self.agricultural_conditions))
+        self.market_development = max(0.8, min(1.2, self.market_development))
+        
+        # Update costs based on economic factors
+        self.update_costs()
+        
+    def update_costs(self):
+        """Update tea leaves and labor costs based on economic factors."""
+        # Tea leaves cost affected by agricultural conditions and economic stability
+        tea_leaves_multiplier = (self.agricultural_conditions * 0.7 + self.economic_stability * 0.3)
+        self.tea_leaves_cost = self.base_tea_leaves_cost * tea_leaves_multiplier
+        
+        # Labor cost affected by labor market pressure and economic stability
+        labor_multiplier = (self.labor_market_pressure * 0.6 + self.economic_stability * 0.4)
+        self.labor_cost = int(self.base_labor_cost * labor_multiplier)
+        
+        # Update price ranges
+        self.min_price = self.tea_leaves_cost * 5
+        self.max_price = self.tea_leaves_cost * 15
+        
+    def randomize_price(self):
+        """Randomize the tea price within region-specific range."""
+        # Base random price
+        base_random = self.rng.uniform(self.min_price, self.max_price)
+        
+        # Apply economic factors
+        economic_modifier = (
+            self.economic_stability * 0.3 +  # 30% influence from economic stability
+            self.market_development * 0.4 +  # 40% influence from market development
+            self.agricultural_conditions * 0.3  # 30% influence from agricultural conditions
+        ) / 3  # Normalize to a reasonable range
+        
+        # Add some market volatility (±20%)
+        volatility = self.rng.uniform(-0.2, 0.2)
+        
+        # Calculate final price
+        final_price = base_random * economic_modifier * (1 + volatility)
+        
+        # Ensure price stays within bounds
+        self.current_tea_price = max(self.min_price, min(self.max_price, final_price))
+        return self.current_tea_price
+
+    @property
+    def workers(self):
+        """{company/player name: workers} in this region."""
+        return self.workforce.column(self.column)
+
+    def get_worker_count(self, company_name):
+        return self.workforce.get(company_name, self.column)
+
+    def update_worker_count(self, company_name, count):
+        self.workforce.add(company_name, self.column, count)
+
+    def get_current_tea_price(self):
+        return self.current_tea_price
+
+    def harvest_tea(self, company, equipment_multiplier):
+        """Calculate the amount of raw tea harvested."""
+        worker_count = self.get_worker_count(company.name)
+        if worker_count is None or worker_count <= 0:
+            return 0
+
+        base_output = worker_count * 100  # Base output per harvester
+        return int(base_output * equipment_multiplier)  # Adjust by equipment multiplier
+
+    def pack_tea(self, company, raw_tea, equipment_multiplier):
+        """Calculate the amount of packed tea produced."""
+        worker_count = self.get_worker_count(company.name)
+        if worker_count is None or worker_count <= 0:
+            return 0
+
+        base_output = worker_count * 75  # Base output per packer
+        packed_tea = min(raw_tea, int(base_output * equipment_multiplier))  # Limit to available raw tea
+        return packed_tea
+
+class RegionEconomy:
+    """Economic state of all regions kept in contiguous NumPy arrays.
+
+    Lets the whole world be updated in one batched pass per turn instead of
+    calling Region.update_economic_factors/randomize_price per region. Salaries,
+    competitor rankings and production also run on these arrays, so a vectorized
+    turn is several times faster from about 100 regions and with many companies,
+    and slightly slower than the per-region loop on the default ten-region map.
+    """
+    FIELDS = (
+        "base_tea_leaves_cost", "base_labor_cost",
+        "economic_stability", "labor_market_pressure",
+        "agricultural_conditions", "market_development",
+        "tea_leaves_cost", "labor_cost",
+        "min_price", "max_price", "current_tea_price",
+    )
+
+    def __init__(self, size, seed=None):
+        if np is None:
+            raise ImportError("NumPy is required for the vectorized economy")
+        self.size = size
+        self.rng = np.random.default_rng(seed)
+        for field in self.FIELDS:
+            setattr(self, field, np.zeros(size))
+
+    def update_economic_factors(self):
+        """Same rules as Region.update_economic_factors, for every region at once."""
+        uniform = self.rng.uniform
+        self.economic_stability *= uniform(0.95, 1.05, self.size)  # ±5% change
+        self.labor_market_pressure *= uniform(0.93, 1.07, self.size)  # ±7% change
+        self.agricultural_conditions *= uniform(0.9, 1.1, self.size)  # ±10% change
+        self.market_development *= uniform(0.95, 1.05, self.size)  # ±5% change
+
+        # Keep factors within reasonable bounds
+        np.clip(self.economic_stability, 0.6, 1.4, out=self.economic_stability)
+        np.clip(self.labor_market_pressure, 0.7, 1.3, out=self.labor_market_pressure)
+        np.clip(self.agricultural_conditions, 0.5, 1.5, out=self.agricultural_conditions)
+        np.clip(self.market_development, 0.8, 1.2, out=self.market_development)
+
+        self.update_costs()
+
+    def update_costs(self):
+        """Same rules as Region.update_costs, for every region at once."""
+        tea_leaves_multiplier = self.agricultural_conditions * 0.7 + self.economic_stability * 0.3
+        np.multiply(self.base_tea_leaves_cost, tea_leaves_multiplier, out=self.tea_leaves_cost)
+
+        labor_multiplier = self.labor_market_pressure * 0.6 + self.economic_stability * 0.4
+        np.trunc(self.base_labor_cost * labor_multiplier, out=self.labor_cost)
+
+        np.multiply(self.tea_leaves_cost, 5, out=self.min_price)
+        np.multiply(self.tea_leaves_cost, 15, out=self.max_price)
+
+    def randomize_prices(self, market_pressure):
+        """Region.randomize_price plus the market pressure from Simulation.update_market_prices."""
+        base_random = self.rng.uniform(self.min_price, self.max_price)
+        economic_modifier = (
+            self.economic_stability * 0.3 +
+            self.market_development * 0.4 +
+            self.agricultural_conditions * 0.3
+        ) / 3
+        volatility = self.rng.uniform(-0.2, 0.2, self.size)
+        base_price = np.clip(base_random * economic_modifier * (1 + volatility), self.min_price, self.max_price)
+
+        # Apply market pressure (±30% effect)
+        pressure_effect = (market_pressure - 1.0) * 0.3
+        np.clip(base_price * (1 + pressure_effect), self.min_price, self.max_price, out=self.current_tea_price)
+
+
+def _economy_field(name):
+    """Region attribute that lives in the shared RegionEconomy arrays."""
+    def getter(self):
+        return getattr(self.economy, name)[self.index].item()
+
+    def setter(self, value):
+        getattr(self.economy, name)[self.index] = value
+
+    return property(getter, setter)
+
+
+class MarketClearing:
+    """Sell orders of one turn, cleared for all regions in a single vectorized pass.
+
+    Sellers (0 is the player, then the companies in order) place market orders
+    during the turn. At clearing, buyers in a region take
+    demand * (reference / price) ** elasticity, where reference is the price
+    randomized for the region this turn. The price settles where that meets the
+    tea offered, within the region's min and max price; if even the min price
+    leaves tea unsold, every seller there gets the same share of its order filled.
+    """
+    def __init__(self, demand, tax_rate, elasticity=MARKET_ELASTICITY):
+        if np is None:
+            raise ImportError("NumPy is required for market clearing")
+        self.demand = demand  # Per region, at the reference price
+        self.tax_rate = tax_rate
+        self.elasticity = elasticity
+        self.sellers = []
+        self.regions = []
+        self.quantities = []
+
+    def __len__(self):
+        return len(self.quantities)
+
+    def submit(self, seller, region, quantity):
+        """Queue a sell order; the tea is already taken from the seller until clearing."""
+        self.sellers.append(seller)
+        self.regions.append(region)
+        self.quantities.append(quantity)
+
+    def orders(self):
+        return zip(self.sellers, self.regions, self.quantities)
+
+    def clear(self, reference, min_price, max_price, seller_count):
+        """Fill all queued orders. Returns per-region prices and, per seller, revenue after tax,
+        tea sold and tea returned unsold."""
+        price = np.clip(reference, min_price, max_price)
+        sellers = np.array(self.sellers, dtype=np.intp)
+        regions = np.array(self.regions, dtype=np.intp)
+        quantities = np.array(self.quantities, dtype=float)
+        self.sellers, self.regions, self.quantities = [], [], []
+        if not len(quantities):
+            zeros = np.zeros(seller_count)
+            return price, zeros, zeros, zeros
+
+        supply = np.bincount(regions, weights=quantities, minlength=len(reference))
+        offered = supply > 0
+        # Price at which demand equals supply, where anything is offered
+        scarcity = np.divide(self.demand, supply, out=np.ones_like(supply), where=offered)
+        np.clip(np.where(offered, reference * scarcity ** (1 / self.elasticity), price), min_price, max_price, out=price)
+        demanded = self.demand * (reference / price) ** self.elasticity
+        fill = np.divide(demanded, supply, out=np.zeros_like(supply), where=offered)
+        fill[fill > 1 - 1e-9] = 1.0  # Unclipped prices meet supply exactly, up to rounding
+
+        # Orders are filled in whole units of tea
+        order_fill = fill[regions]
+        filled = np.where(order_fill >= 1.0, quantities, np.floor(quantities * order_fill))
+        revenue = filled * (price * (1 - self.tax_rate))[regions]
+        return (price,
+                np.bincount(sellers, weights=revenue, minlength=seller_count),
+                np.bincount(sellers, weights=filled, minlength=seller_count),
+                np.bincount(sellers, weights=quantities - filled, minlength=seller_count))
+
+class VectorRegion(Region):
+    """Region whose economic state is a row of a RegionEconomy."""
+    def __init__(self, name, data, economy, index, rng=random, workforce=None):
+        self.economy = economy
+        self.index = index
+        super().__init__(name, data, rng, workforce, index)
+
+for _field in RegionEconomy.FIELDS:
+    setattr(VectorRegion, _field, _economy_field(_field))
+del _field
+
+class HistoryTable:
+    """Per-turn values of some metrics for a fixed list of entities (regions or agents).
+
+    Each metric is a single typed array holding one row of entity values per
+    recorded turn, so recording a turn is one extend per metric and a long
+    game keeps no Python float objects alive. It is still not free: from 100
+    regions up recording takes about 7-17% of a turn, and a third of a
+    vectorized one at 1000 regions. Every turn also adds 28 bytes per region
+    to saves. Games nobody charts should pass Simulation(history=False).
+    """
+    def __init__(self, entities, metrics, typecode="d", first_turn=0):
+        self.entities = list(entities)
+        self.index = {name: i for i, name in enumerate(self.entities)}
+        self.columns = {metric: array(typecode) for metric in metrics}
+        self.first_turn = first_turn  # Turn of the first row
+        self.rows = 0
+
+    def __len__(self):
+        return self.rows
+
+    @property
+    def last_turn(self):
+        return self.first_turn + self.rows - 1
+
+    def append(self, rows):
+        """Add the next turn. `rows` maps every metric to its values in entity order:
+        an iterable of numbers, or a NumPy array."""
+        for metric, column in self.columns.items():
+            values = rows[metric]
+            if np is not None and isinstance(values, np.ndarray):
+                column.frombytes(values.astype(column.typecode).tobytes())
+            else:
+                column.extend(values)
+        self.rows += 1
+
+    def turn_range(self, start=None, stop=None):
+        """Recorded turns in [start, stop), clamped to what is recorded."""
+        start = self.first_turn if start is None else max(start, self.first_turn)
+        stop = self.first_turn + self.rows if stop is None else min(stop, self.first_turn + self.rows)
+        return start, max(start, stop)
+
+    def series(self, metric, entity, start=None, stop=None):
+        """Values of one entity over turns [start, stop), as a typed array."""
+        start, stop = self.turn_range(start, stop)
+        width = len(self.entities)
+        offset = self.index[entity]
+        return self.columns[metric][(start - self.first_turn) * width + offset:(stop - self.first_turn) * width:width]
+
+    def downsample(self, metric, entity, buckets, start=None, stop=None):
+        """At most `buckets` (first turn, min, max) tuples covering turns [start, stop), e.g. one per chart pixel."""
+        first, _ = self.turn_range(start, stop)
+        values = self.series(metric, entity, start, stop)
+        count = len(values)
+        if count <= buckets:
+            return [(first + i, value, value) for i, value in enumerate(values)]
+        result = []
+        for bucket in range(buckets):
+            low = bucket * count // buckets
+            chunk = values[low:(bucket + 1) * count // buckets]
+            result.append((first + low, min(chunk), max(chunk)))
+        return result
+
+class GameLog:
+    """Ring buffer of the latest log messages, optionally spilling the full history to a file."""
+    def __init__(self, max_lines=LOG_WINDOW_SIZE, history_path=None):
+        self.lines = deque(maxlen=max_lines)
+        self.total = 0  # Messages ever logged; also the sequence number of the next one
+        self.history_file = None
+        if history_path:
+            try:
+                self.history_file = open(history_path, "a", encoding="utf-8", buffering=1)
+            except OSError as e:
+                print(f"Could not open log history {history_path}: {e}")
+
+    def __len__(self):
+        return len(self.lines)
+
+    def append(self, message):
+        self.lines.append(message)
+        self.total += 1
+        if self.history_file:
+            self.history_file.write(message + "\n")
+
+    def page(self, count, offset=0):
+        """Up to `count` (sequence number, message) pairs ending `offset` messages before the newest."""
+        end = max(0, len(self.lines) - offset)
+        start = max(0, end - count)
+        first_seq = self.total - len(self.lines)
+        return [(first_seq + i, message) for i, message in enumerate(islice(self.lines, start, end), start)]
+
+    def close(self):
+        if self.history_file:
+            self.history_file.close()
+            self.history_file = None
+
+class StageTimer:
+    """Wall-clock milliseconds spent in named stages, for the performance HUD."""
+    def __init__(self, prefix=""):
+        self.timings = {}
+        self.last = time.perf_counter()
+        self.prefix = prefix  # Stage name prefix in the allocation report
+        self.allocations = None  # AllocationTracker, if allocations are tracked
+
+    def reset(self):
+        self.timings = {}
+        self.mark()
+
+    def mark(self):
+        """Start timing from now (time since the previous lap is not counted)."""
+        self.last = time.perf_counter()
+        if self.allocations:
+            self.allocations.mark()
+
+    def lap(self, name):
+        """Add the time since the previous mark or lap to stage `name`."""
+        now = time.perf_counter()
+        self.timings[name] = self.timings.get(name, 0.0) + (now - self.last) * 1000
+        self.last = now
+        if self.allocations:
+            self.allocations.record(self.prefix + name)
+
+class AllocationTracker:
+    """Memory allocated in each StageTimer stage, measured with tracemalloc.
+
+    Only Python allocations are traced: SDL pixel buffers of surfaces are not,
+    so a new Surface shows up as its (small) Python object.
+    """
+    def __init__(self, frames=1):
+        self.stages = {}  # Stage name : [calls, peak bytes, retained bytes, retained blocks, gc runs]
+        self.gc_runs = 0
+        gc.callbacks.append(self.on_gc)
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(frames)
+        self.mark()
+
+    def on_gc(self, phase, info):
+        if phase == "start":
+            self.gc_runs += 1
+
+    def mark(self):
+        tracemalloc.reset_peak()
+        self.start_bytes = tracemalloc.get_traced_memory()[0]
+        self.start_blocks = sys.getallocatedblocks()
+        self.start_gc_runs = self.gc_runs
+
+    def record(self, name):
+        """Add everything allocated since the previous mark or record to stage `name`."""
+        current, peak = tracemalloc.get_traced_memory()
+        blocks = sys.getallocatedblocks()
+        stats = self.stages.setdefault(name, [0, 0, 0, 0, 0])
+        stats[0] += 1
+        stats[1] += peak - self.start_bytes
+        stats[2] += current - self.start_bytes
+        stats[3] += blocks - self.start_blocks
+        stats[4] += self.gc_runs - self.start_gc_runs
+        self.mark()
+
+    def report(self, file=None):
+        """Print the stages ranked by the memory they allocate."""
+        file = file or sys.stdout
+        ranked = sorted(self.stages.items(), key=lambda item: item[1][1], reverse=True)
+        print(f"{'stage':28} {'calls':>8} {'peak KiB/call':>14} {'total MiB':>10} "
+              f"{'retained KiB':>13} {'retained blocks':>16} {'gc runs':>8}", file=file)
+        for name, (calls, peak, retained, blocks, gc_runs) in ranked:
+            print(f"{name:28} {calls:8} {peak / calls / 1024:14.2f} {peak / 2**20:10.2f} "
+                  f"{retained / 1024:13.1f} {blocks:16} {gc_runs:8}", file=file)
+
+    def stop(self):
+        if self.on_gc in gc.callbacks:
+            gc.callbacks.remove(self.on_gc)
+        tracemalloc.stop()
+
+class _SnapshotWriter:
+    """Little-endian binary encoder for Simulation snapshots."""
+    def __init__(self):
+        self.parts = []
+
+    def pack(self, fmt, *values):
+        self.parts.append(struct.pack("<" + fmt, *values))
+
+    def string(self, text):
+        data = text.encode("utf-8")
+        self.pack("I", len(data))
+        self.parts.append(data)
+
+    def value(self, value):
+        """A tagged scalar; ints and floats keep their type so a resumed game stays identical."""
+        if value is None:
+            self.pack("c", b"N")
+        elif isinstance(value, bool):
+            self.pack("c", b"T" if value else b"F")
+        elif isinstance(value, int):
+            if -2**63 <= value < 2**63:
+                self.pack("cq", b"i", value)
+            else:
+                self.pack("c", b"b")
+                self.string(str(value))
+        elif isinstance(value, float):
+            self.pack("cd", b"f", value)
+        elif isinstance(value, str):
+            self.pack("c", b"s")
+            self.string(value)
+        else:
+            raise TypeError(f"Cannot save value of type {type(value).__name__}")
+
+    def values(self, obj, names):
+        for name in names:
+            self.value(getattr(obj, name))
+
+    def mapping(self, mapping):
+        self.pack("I", len(mapping))
+        for key, value in mapping.items():
+            self.value(getattr(key, "name", key))  # Regions are saved by name
+            self.value(value)
+
+    def array(self, values):
+        """An array.array's items, without a length."""
+        if sys.byteorder == "big":
+            values = array(values.typecode, values)
+            values.byteswap()
+        self.parts.append(values.tobytes())
+
+    def random_state(self, rng):
+        version, internal_state, gauss_next = rng.getstate()
+        self.pack("B%dI" % len(internal_state), version, *internal_state)
+        self.value(gauss_next)
+
+    def getvalue(self):
+        return b"".join(self.parts)
+
+class _SnapshotReader:
+    """Decoder matching _SnapshotWriter."""
+    def __init__(self, data):
+        self.data = data
+        self.offset = 0
+
+    def unpack(self, fmt):
+        fmt = "<" + fmt
+        values = struct.unpack_from(fmt, self.data, self.offset)
+        self.offset += struct.calcsize(fmt)
+        return values
+
+    def string(self):
+        (length,) = self.unpack("I")
+        text = self.data[self.offset:self.offset + length].decode("utf-8")
+        self.offset += length
+        return text
+
+    def value(self):
+        (tag,) = self.unpack("c")
+        if tag == b"N":
+            return None
+        if tag in (b"T", b"F"):
+            return tag == b"T"
+        if tag == b"i":
+            return self.unpack("q")[0]
+        if tag == b"b":
+            return int(self.string())
+        if tag == b"f":
+            return self.unpack("d")[0]
+        if tag == b"s":
+            return self.string()
+        raise ValueError(f"Corrupt save game: unknown value tag {tag!r}")
+
+    def values(self, obj, names):
+        for name in names:
+            setattr(obj, name, self.value())
+
+    def mapping(self):
+        (count,) = self.unpack("I")
+        return {self.value(): self.value() for _ in range(count)}
+
+    def array(self, values, count):
+        """Append `count` items to the array.array `values`."""
+        size = count * values.itemsize
+        items = array(values.typecode)
+        items.frombytes(self.data[self.offset:self.offset + size])
+        self.offset += size
+        if sys.byteorder == "big":
+            items.byteswap()
+        values.extend(items)
+
+    def random_state(self, rng):
+        (version,) = self.unpack("B")
+        internal_state = self.unpack("625I")
+        rng.setstate((version, internal_state, self.value()))
+
+class Simulation:
+    """Game state and turn logic. Needs no display, fonts or images."""
+    def __init__(self, vectorized=False, target_money=TARGET_MONEY, monopoly_threshold=MONOPOLY_THRESHOLD,
+                 event_chance=RANDOM_EVENT_CHANCE, money_multiplier=COMPANY_MONEY_MULTIPLIER,
+                 tea_multiplier=COMPANY_TEA_MULTIPLIER, log_path=None, seed=None,
+                 regions=REGIONS, company_count=COMPANY_COUNT, market_clearing=False, history=True):
+        # Every subsystem draws from its own stream derived from one seed, so a
+        # game can be replayed exactly and one subsystem's draws never shift another's
+        if seed is None:
+            seed = random.SystemRandom().getrandbits(63)
+        self.seed = seed
+        self.economy_rng = random.Random(f"{seed}:economy")
+        self.competitor_rng = random.Random(f"{seed}:competitors")
+        self.event_rng = random.Random(f"{seed}:events")
+
+        self.player = Player()
+        # Create more aggressive competitor companies with higher starting resources
+        self.companies = [
+            Company(f"Компания {i+1}", 
+                   money_multiplier=self.competitor_rng.uniform(*money_multiplier),
+                   tea_multiplier=self.competitor_rng.uniform(*tea_multiplier),
+                   rng=self.competitor_rng
+            ) for i in range(company_count)
+        ]
+
+        # Workers of every agent in every region, one column per region
+        self.workforce = WorkerMatrix(len(regions), [self.player.name] + [company.name for company in self.companies],
+                                      vectorized)
+        if vectorized:
+            # All regions share one set of arrays, updated in a single pass per turn
+            self.economy = RegionEconomy(len(regions), seed=self.economy_rng.getrandbits(64))
+            self.regions = {
+                name: VectorRegion(name, data, self.economy, index, self.economy_rng, self.workforce)
+                for index, (name, data) in enumerate(regions.items())
+            }
+        else:
+            self.economy = None
+            self.regions = {
+                name: Region(name, data, self.economy_rng, self.workforce, index)
+                for index, (name, data) in enumerate(regions.items())
+            }
+        self.log = GameLog(history_path=log_path)
+        self.market_demand = 100000
+        # Sales go through per-region markets cleared at the end of the turn, or are paid at once
+        self.market = self.make_market() if market_clearing else None
+        self.history = None
+        self.global_tea_supply = 0
+        self.global_tea_demand = 0
+
+        self.game_over = False
+        self.winner = None
+        self.end_reason = None  # Which win/lose condition ended the game
+        self.target_money = target_money
+        self.monopoly_threshold = monopoly_threshold
+        self.event_chance = event_chance
+        self.turn_count = 0  # Track number of turns played
+        self.turn_timer = StageTimer("turn.")  # Stage timings of the last turn
+
+        # Set up initial market prices
+        self.update_market_prices()
+        if history:
+            self.start_history()
+
+    def next_turn(self):
+        """Advance the game by one turn. Returns True once the game is over."""
+        if self.game_over:
+            return self.game_over
+
+        self.turn_count += 1  # Increment turn count
+        self.turn_timer.reset()
+        self.process_turn()
+        self.update_market_prices()
+        if self.market is not None:
+            self.clear_market()
+        self.turn_timer.lap("market_prices")
+        self.add_message(f"--- Ход {self.turn_count} ---")
+
+        # Check win/lose conditions after each turn
+        if self.check_win_condition():
+            self.add_message(f"{self.winner} выиграл игру!")
+        elif self.check_lose_condition():
+            self.add_message(f"Игра окончена! Победитель: {self.winner}!")
+
+        if self.history is not None:
+            self.record_history()
+        self.turn_timer.lap("history")
+        return self.game_over
+
+    def history_tables(self):
+        """Empty region and agent history, starting at the current turn."""
+        return {
+            "regions": HistoryTable(self.regions, REGION_HISTORY_METRICS, "f", self.turn_count),
+            "agents": HistoryTable([self.player.name] + [company.name for company in self.companies],
+                                   AGENT_HISTORY_METRICS, "d", self.turn_count),
+        }
+
+    def start_history(self):
+        """Begin recording region and agent metrics with the current turn."""
+        self.history = self.history_tables()
+        self.record_history()
+
+    def record_history(self):
+        economy = self.economy
+        if economy is not None:
+            self.history["regions"].append({metric: getattr(economy, metric) for metric in REGION_HISTORY_METRICS})
+        else:
+            regions = self.regions.values()
+            self.history["regions"].append({metric: [getattr(region, metric) for region in regions]
+                                            for metric in REGION_HISTORY_METRICS})
+        agents = [self.player] + self.companies
+        self.history["agents"].append({metric: [getattr(agent, metric) for agent in agents]
+                                       for metric in AGENT_HISTORY_METRICS})
+
+    def check_win_condition(self):
+        """Check if victory conditions are met."""
+        # Must meet EITHER conditions to win
+        money_condition = self.player.money >= self.target_money
+        
+        # Calculate market share
+        total_tea = self.player.get_total_tea()
+        for company in self.companies:
+            total_tea += company.get_total_tea()
+
+        if total_tea > 0: # only calculate if tea exists
+            self.player.owned_tea_percentage = self.player.get_total_tea() / total_tea
+            for company in self.companies:
+                company.owned_tea_percentage = company.get_total_tea() / total_tea
+
+            market_share_condition = self.player.owned_tea_percentage >= self.monopoly_threshold
+            
+            # Only win if EITHER condition is met and enough turns have passed
+            if self.turn_count >= MIN_TURNS_TO_WIN:
+                if money_condition or market_share_condition:
+                    self.game_over = True
+                    self.winner = self.player.name
+                    self.end_reason = "target_money" if money_condition else "monopoly_threshold"
+
+        return self.game_over
+
+    def check_lose_condition(self):
+        if self.player.money <= 0:
+            self.game_over = True
+            self.winner = "Оставшиеся" # loose by money
+            self.end_reason = "bankrupt"
+
+        # check if competitor wins
+        for company in self.companies:
+            if company.money >= self.target_money or company.owned_tea_percentage >= self.monopoly_threshold:
+                self.game_over = True
+                self.winner = company.name # loose by competitor
+                self.end_reason = "competitor_money" if company.money >= self.target_money else "competitor_share"
+        return self.game_over
+
+    def update_market_prices(self):
+        # Calculate total supply and demand
+        total_supply = self.player.get_total_tea()
+        for company in self.companies:
+            total_supply += company.get_total_tea()
+        self.global_tea_supply = total_supply
+
+        if total_supply == 0:
+            self.global_tea_supply = 1  # avoid division by zero
+            self.global_tea_demand = self.market_demand  # initial demand
+        else:
+            self.global_tea_demand = self.market_demand
+
+        # Calculate global market pressure (affects volatility). Cleared markets set
+        # their own prices from what is actually sold in each region instead.
+        market_pressure = self.global_tea_demand / self.global_tea_supply if self.global_tea_supply > 0 else 2.0
+        if self.market is not None:
+            market_pressure = 1.0
+
+        if self.economy is not None:
+            self.economy.randomize_prices(market_pressure)
+            return
+
+        # Update each region's price independently
+        for region in self.regions.values():
+            # Randomize base price
+            base_price = region.randomize_price()
+            
+            # Apply market pressure (±30% effect)
+            pressure_effect = (market_pressure - 1.0) * 0.3
+            final_price = base_price * (1 + pressure_effect)
+            
+            # Ensure price stays within region's bounds
+            region.current_tea_price = max(region.min_price, min(region.max_price, final_price))
+            
+        # Add message about price changes
+        #self.add_message("Tea prices have been updated in all regions!")
+
+    def execute_order(self, region_name, action, quantity):
+        """Validate and carry out one player order as a single step, all or nothing.
+
+        `action` is one of ORDER_ACTIONS: "buy" tea leaves, "sell" packed tea,
+        "hire" or "fire" workers. Returns (executed, message for the log).
+        """
+        region = self.regions[region_name]
+        player = self.player
+        if action not in ORDER_ACTIONS:
+            raise ValueError(f"Unknown order action {action!r}")
+        if quantity <= 0:
+            return False, "Количество должно быть больше нуля."
+
+        if action == "buy":
+            cost = region.tea_leaves_cost * quantity
+            if player.money < cost:
+                return False, "Недостаточно средств для покупки."
+            player.money -= cost
+            player.tea_leaves += quantity  # Assuming green tea for simplicity
+            return True, f"Куплено {quantity} чайных листьев в {region_name} за ${cost:,.2f}"
+
+        if action == "sell":
+            if player.processed_tea < quantity:
+                return False, "Недостаточно чая для продажи."
+            player.processed_tea -= quantity
+            if self.market is not None:
+                self.market.submit(0, region.column, quantity)
+                return True, f"Выставлено на продажу {quantity} чая в {region_name} (продажа в конце хода)"
+            revenue = region.current_tea_price * quantity * (1 - region.tax_rate)
+            player.money += revenue
+            return True, f"Продано {quantity} чая в {region_name} за ${revenue:,.2f} (Налог: {region.tax_rate:.2f})"
+
+        if action == "hire":
+            if affordable_workers(player.money, region.labor_cost, region.labor_cost, quantity) < quantity:
+                return False, "Недостаточно средств для найма рабочих."
+            player.hire_workers(region, quantity)
+            return True, f"Нанято рабочих в {region_name}: {quantity}."
+
+        if region.get_worker_count(player.name) < quantity:
+            return False, "Некого увольнять."
+        player.fire_workers(region, quantity)
+        return True, f"Уволено рабочих в {region_name}: {quantity}."
+
+    def make_market(self):
+        """Cleared markets where each region's buyers take its share of market_demand, by potential_tea.
+        Regions without any potential get no buyers; a world without any splits the demand evenly."""
+        if np is None:
+            raise ImportError("NumPy is required for market clearing")
+        regions = self.regions.values()
+        potential = np.fromiter((region.potential_tea for region in regions), float, len(regions)).clip(min=0)
+        total = potential.sum()
+        shares = potential / total if total > 0 else np.full(len(regions), 1 / len(regions))
+        return MarketClearing(self.market_demand * shares,
+                              np.fromiter((region.tax_rate for region in regions), float, len(regions)))
+
+    def clear_market(self):
+        """Sell this turn's orders at each region's clearing price, which becomes its current price."""
+        if np is None:
+            raise ImportError("NumPy is required for market clearing")
+        economy = self.economy
+        if economy is not None:
+            reference, min_price, max_price = economy.current_tea_price, economy.min_price, economy.max_price
+        else:
+            regions = self.regions.values()
+            reference, min_price, max_price = (np.fromiter((getattr(region, field) for region in regions), float, len(regions))
+                                               for field in ("current_tea_price", "min_price", "max_price"))
+        agents = [self.player] + self.companies
+        price, revenue, sold, unsold = self.market.clear(reference, min_price, max_price, len(agents))
+
+        if economy is not None:
+            economy.current_tea_price[:] = price
+        else:
+            for region, region_price in zip(self.regions.values(), price.tolist()):
+                region.current_tea_price = region_price
+        for index in np.flatnonzero(sold + unsold).tolist():
+            agent = agents[index]
+            agent.money += revenue[index].item()
+            agent.processed_tea += unsold[index].item()
+            if index == 0:
+                self.add_message(f"Продано {sold[0]:,.0f} из {sold[0] + unsold[0]:,.0f} чая на рынках "
+                                 f"за ${revenue[0]:,.2f}")
+
+    def buy_tea_leaves(self, region_name):
+        return self.execute_order(region_name, "buy", 100)[0]  # simplified, buying only 100 leaves
+
+    def sell_tea(self, region_name):
+        return self.execute_order(region_name, "sell", 100)[0]  # simplified, selling only 100 tea
+
+    def hire_worker(self, region_name):
+        return self.execute_order(region_name, "hire", 1)[0]
+
+    def fire_worker(self, region_name):
+        return self.execute_order(region_name, "fire", 1)[0]
+
+    def process_turn(self):
+        # 1. Update economic conditions in all regions
+        if self.economy is not None:
+            self.economy.update_economic_factors()
+        else:
+            for region in self.regions.values():
+                region.update_economic_factors()
+        self.turn_timer.lap("economy")
+        
+        # 2. Collect payments (workers' salaries)
+        if self.economy is not None and self.player.money >= 0:
+            self.pay_salaries_batched()
+        else:
+            self.pay_salaries()
+        self.turn_timer.lap("salaries")
+
+        if self.workforce.vectorized:
+            # 3. + 4. Harvesting and packing in every region at once
+            self.produce_player_batched()
+        else:
+            self.produce_player()
+        # 5. Taxes cut out
+        # 6. Random Events
+        self.trigger_random_event()
+        self.turn_timer.lap("events")
+
+        # 7. Competitor Actions (very basic)
+        self.competitor_turn()
+        self.turn_timer.lap("competitors")
+
+    def pay_salaries(self):
+        for region_name, region in self.regions.items():
+            worker_cost = region.get_worker_count(self.player.name) * region.labor_cost
+            if self.player.money >= worker_cost:
+                self.player.money -= worker_cost
+                #self.add_message(f"Выплачено ${worker_cost:,.2f} рабочим в {region_name}")
+            else:
+                self.player.money = 0
+                self.add_message(f"Недостаточно средств на зарплаты в {region_name}! {region.get_worker_count(self.player.name)} уволились")
+                region.update_worker_count(self.player.name, 0)  # if can't pay, workers leave.
+                continue  # Skip further processing for this region
+
+    def pay_salaries_batched(self):
+        """pay_salaries on the economy arrays. Regions without the player's workers cost nothing
+        and, while money is not negative, always pass the check, so only the player's active
+        columns are visited, in region order. Money is still taken one region at a time."""
+        player = self.player
+        workforce = self.workforce
+        row = workforce.rows[player.name]
+        columns = sorted(workforce.active[row])
+        workers = workforce.counts[row][columns]
+        costs = workers * self.economy.labor_cost[columns]
+        region_names = None
+        last_failed = False
+        for column, count, cost in zip(columns, workers.tolist(), costs.tolist()):
+            if player.money >= cost:
+                player.money -= cost
+                last_failed = False
+            else:
+                player.money = 0
+                last_failed = column == len(self.regions) - 1
+                if region_names is None:
+                    region_names = list(self.regions)
+                self.add_message(f"Недостаточно средств на зарплаты в {region_names[column]}! {count} уволились")
+        if not last_failed:
+            player.money = float(player.money)  # The loop subtracts a float cost in every later region
+
+    def produce_player(self):
+        # 3. Harvesting
+        for region_name, region in self.regions.items():
+            raw_tea = region.harvest_tea(self.player, self.player.equipment_multiplier)
+            self.player.tea_leaves += raw_tea  # Assuming green tea for simplicity
+            #self.add_message(f"Harvested {raw_tea} raw Tea in {region_name}")
+        self.turn_timer.lap("harvest")
+
+        # 4. Packing
+        for region_name, region in self.regions.items():
+            packed_tea = region.pack_tea(self.player, self.player.tea_leaves, self.player.equipment_multiplier)
+            self.player.processed_tea += packed_tea
+            self.player.tea_leaves -= packed_tea  # Reduce raw tea by the amount packed
+            #self.add_message(f"Packed {packed_tea} Tea in {region_name}")
+        self.turn_timer.lap("pack")
+
+    def produce_player_batched(self):
+        """produce_player for all regions at once; the player's tea is counted in whole units, so totals are exact."""
+        player = self.player
+        workers = self.workforce.counts[self.workforce.rows[player.name]]
+        workers = workers[workers > 0]
+        if not len(workers):
+            self.turn_timer.lap("harvest")
+            self.turn_timer.lap("pack")
+            return
+        player.tea_leaves += int(np.trunc(workers * 100 * player.equipment_multiplier).sum())
+        self.turn_timer.lap("harvest")
+
+        # Packing region by region uses leaves until they run out. Negative stock (after pests)
+        # is used up entirely by the first region with workers.
+        capacity = int(np.trunc(workers * 75 * player.equipment_multiplier).sum())
+        packed = min(player.tea_leaves, capacity) if player.tea_leaves >= 0 else player.tea_leaves
+        player.processed_tea += packed
+        player.tea_leaves -= packed
+        self.turn_timer.lap("pack")
+
+    def produce_companies_batched(self, profitable_columns):
+        """Harvest and pack for every company at once, with the same results as the per-region loop.
+
+        Each company works through its regions in order of profitability, so its
+        regions with workers are packed to the front of its row and the steps
+        run in lockstep across companies. Every step does the same float
+        operations, in the same order, as the loop.
+        """
+        if not self.companies or not profitable_columns:
+            return
+        workforce = self.workforce
+        rows = [workforce.rows[company.name] for company in self.companies]
+        workers = workforce.counts[np.ix_(rows, profitable_columns)]
+        active = workers > 0
+        steps = int(active.sum(axis=1).max())
+        if not steps:
+            return
+        order = np.argsort(~active, axis=1, kind="stable")[:, :steps]
+        workers = np.take_along_axis(workers, order, axis=1)
+        active = np.take_along_axis(active, order, axis=1)
+
+        multipliers = np.array([company.equipment_multiplier for company in self.companies])[:, None]
+        harvested = np.where(active, np.trunc(workers * 100 * multipliers), 0.0)
+        capacity = np.trunc(workers * 75 * multipliers)
+        leaves = np.array([company.tea_leaves for company in self.companies], dtype=np.float64)
+        processed = np.array([company.processed_tea for company in self.companies], dtype=np.float64)
+        if len(self.companies) < LOCKSTEP_MIN_COMPANIES:
+            # A NumPy call per step costs more than a float loop per company here
+            for index, counts in enumerate(active.sum(axis=1).tolist()):
+                stock, packed_total = leaves[index].item(), processed[index].item()
+                for crop, limit in zip(harvested[index, :counts].tolist(), capacity[index, :counts].tolist()):
+                    stock += crop
+                    packed = min(stock, limit)
+                    packed_total += packed
+                    stock -= packed
+                leaves[index], processed[index] = stock, packed_total
+        else:
+            for step in range(steps):
+                leaves += harvested[:, step]
+                packed = np.where(active[:, step], np.minimum(leaves, capacity[:, step]), 0.0)
+                processed += packed
+                leaves -= packed
+
+        for index in np.flatnonzero(active[:, 0]):
+            company = self.companies[index]
+            # Whole-number stock stays an int, as it does in the loop
+            company.tea_leaves = type(company.tea_leaves)(leaves[index].item())
+            company.processed_tea = type(company.processed_tea)(processed[index].item())
+
+    def rank_regions(self):
+        """Region rankings every competitor uses this turn, as lists of columns.
+
+        Profit and hiring scores only differ between companies by their
+        aggressive_factor, which never changes the order, so both lists are
+        computed once per turn instead of once per company.
+        """
+        economy = self.economy
+        if economy is not None:
+            return self.rank_regions_batched(economy)
+        # Most profitable first (price over leaf cost), then cheapest labor first
+        profitable_regions = [region for region in self.regions.values()
+                              if region.current_tea_price > region.tea_leaves_cost]
+        profitable_regions.sort(key=lambda region: region.current_tea_price - region.tea_leaves_cost, reverse=True)
+        hiring_regions = heapq.nsmallest(3, (region for region in self.regions.values() if region.labor_cost > 0),
+                                         key=lambda region: region.labor_cost)
+        return [region.column for region in profitable_regions], [region.column for region in hiring_regions]
+
+    @staticmethod
+    def rank_regions_batched(economy):
+        """rank_regions on the economy arrays. Stable sorts keep ties in region order, as
+        list.sort and heapq.nsmallest do; labor costs are whole dollars, so ties are common."""
+        margin = economy.current_tea_price - economy.tea_leaves_cost
+        profitable = np.flatnonzero(margin > 0)
+        profitable = profitable[np.argsort(-margin[profitable], kind="stable")]
+
+        labor = economy.labor_cost
+        hiring = np.flatnonzero(labor > 0)
+        if len(hiring) > 3:
+            third = np.partition(labor[hiring], 2)[2]
+            hiring = hiring[labor[hiring] <= third]  # The 3 cheapest and whatever ties with the third
+        hiring = hiring[np.argsort(labor[hiring], kind="stable")[:3]]
+        return profitable.tolist(), hiring.tolist()
+
+    def competitor_turn(self):
+        """Simulates actions for competitor companies."""
+        profitable_columns, hiring_columns = self.rank_regions()
+        region_list = list(self.regions.values())
+        hiring_regions = [region_list[column] for column in hiring_columns]
+        # Prices, taxes and columns of the 3 best markets, read once for all companies
+        top_markets = [(region_list[column].current_tea_price, region_list[column].tax_rate, column)
+                       for column in profitable_columns[:3]]
+        market = self.market
+
+        # Companies only produce where they have workers, so each one visits just those of the
+        # profitable regions, in order of profitability. Nobody else's hiring changes them this turn,
+        # which also lets the vectorized simulation produce for all companies up front.
+        workforce = self.workforce
+        batched = workforce.vectorized
+        if batched:
+            self.produce_companies_batched(profitable_columns)
+        else:
+            profit_rank = {column: rank for rank, column in enumerate(profitable_columns)}
+
+        for seller, company in enumerate(self.companies, 1):
+            producing = ()
+            if not batched:
+                active = workforce.active[workforce.rows[company.name]]
+                producing = sorted((column for column in active if column in profit_rank), key=profit_rank.__getitem__)
+            # Harvest and pack in every profitable region, most profitable first
+            for column in producing:
+                region = region_list[column]
+                # Harvesting with improved efficiency
+                raw_tea = region.harvest_tea(company, company.equipment_multiplier)
+                company.tea_leaves += raw_tea
+                # Packing with improved efficiency
+                packed_tea = region.pack_tea(company, company.tea_leaves, company.equipment_multiplier)
+                company.processed_tea += packed_tea
+                company.tea_leaves -= packed_tea
+
+            for price, tax_rate, column in top_markets:
+                # More aggressive selling
+                sell_amount = min(100 * int(company.aggressive_factor), company.processed_tea)
+                if sell_amount > 0:
+                    if market is not None:
+                        market.submit(seller, column, sell_amount)
+                    else:
+                        revenue = price * sell_amount * (1 - tax_rate)
+                        company.money += revenue
+                    company.processed_tea -= sell_amount
+
+            # Hire workers in the 3 regions with the cheapest labor
+            for region in hiring_regions:
+                # Companies hire more aggressively
+                workers_to_hire = self.competitor_rng.randint(1, 3)*2*int(company.aggressive_factor)  # Hire multiple workers at once
+                company.hire_workers(region, workers_to_hire)  # As many as it can afford
+
+            # Companies might upgrade their equipment (dummied out)
+            #if company.money > 5000 and random.random() < 0.2:  # 20% chance to upgrade if can afford
+            #    upgrade_cost = 5000
+            #    company.money -= upgrade_cost
+            #    company.equipment_multiplier *= 1.2  # 20% improvement
+
+    def trigger_random_event(self):
+        event_chance = self.event_rng.random()
+        if event_chance < self.event_chance:
+            event_type = self.event_rng.randint(1, 5)
+            self.random_event(event_type)
+
+    def random_event(self, event_type):
+        if event_type == 1:  # Loss of tea due to spoilage
+            loss_percentage = self.event_rng.uniform(0.1, 0.3)  # 10-30% loss
+            loss_amount = int(self.player.processed_tea * loss_percentage)
+            self.player.processed_tea -= loss_amount
+            self.add_message(f"Порча товара. Потеряно {loss_amount} чая.")
+
+            # Apply similar loss to competitors
+            for company in self.companies:
+                loss_amount_comp = int(company.processed_tea * loss_percentage)
+                company.processed_tea -= loss_amount_comp
+                self.add_message(f"Порча товара. {company.name} потеряла {loss_amount_comp} чая.")
+
+        elif event_type == 2:  # Labor strike
+            region_name = self.event_rng.choice(list(self.regions.keys()))
+            region = self.regions[region_name]
+            workers_affected = int(region.get_worker_count(self.player.name) * 0.5)  # 50% of workers on strike
+            region.update_worker_count(self.player.name, -workers_affected)
+            self.add_message(f"Забастовка в {region.name}! {workers_affected} человек бастуют.")
+
+        elif event_type == 3:  # Market crash reduces company funds
+            loss_percentage = self.event_rng.uniform(0.2, 0.6)  # 20-60% loss
+            loss_amount = int(self.player.money * loss_percentage)
+            self.player.money -= loss_amount
+            self.add_message(f"Обвал акций на фондовом рынке! Потеряно ${loss_amount:,.2f}.")
+
+            # Apply similar loss to competitors
+            for company in self.companies:
+                loss_amount_comp = int(company.money * loss_percentage)
+                company.money -= loss_amount_comp
+                self.add_message(f"{company.name} потеряла ${loss_amount_comp:,.2f} из-за обвала на фондовом рынке.")
+
+        elif event_type == 4:  # Unexpected demand increases tea prices
+            price_increase = self.event_rng.uniform(1.1, 1.5)  # Random price increase factor
+            if self.economy is not None:
+                self.economy.current_tea_price *= price_increase
+            else:
+                for region in self.regions.values():
+                    region.current_tea_price *= price_increase
+            self.add_message("Неожиданный рост спроса на чай. Цены увеличились!")
+
+        elif event_type == 5:  # Pest outbreak reduces tea production
+            region_name = self.event_rng.choice(list(self.regions.keys()))
+            region = self.regions[region_name]
+            production_loss = int(region.get_worker_count(self.player.name) * 0.3)  # 30% production loss
+            self.player.tea_leaves -= production_loss # lost tea leaves because of outbreak
+            self.add_message(f"Вредителями съедено {production_loss} чайных листьев.")
+
+    def add_message(self, message):
+        """Add a message to the message log."""
+        self.log.append(message)
+
+    # --- Save games ---
+    SAVED_FIELDS = ("seed", "target_money", "monopoly_threshold", "event_chance", "market_demand",
+                    "global_tea_supply", "global_tea_demand", "game_over", "winner", "end_reason", "turn_count")
+    PLAYER_FIELDS = ("name", "money", "tea_leaves", "processed_tea", "equipment_multiplier", "owned_tea_percentage")
+    COMPANY_FIELDS = PLAYER_FIELDS + ("aggressive_factor",)
+    SAVED_REGION_FIELDS = ("name", "base_tea_leaves_cost", "base_labor_cost", "tax_rate", "potential_tea",
+                     "economic_stability", "labor_market_pressure", "agricultural_conditions", "market_development",
+                     "tea_leaves_cost", "labor_cost", "min_price", "max_price", "current_tea_price")
+
+    def to_bytes(self):
+        """Serialize the complete game state, RNG streams included, into a compact versioned snapshot."""
+        out = _SnapshotWriter()
+        out.values(self, self.SAVED_FIELDS)
+        out.value(self.economy is not None)
+        for rng in (self.economy_rng, self.competitor_rng, self.event_rng):
+            out.random_state(rng)
+        if self.economy is not None:
+            state = self.economy.rng.bit_generator.state
+            if state["bit_generator"] != "PCG64":
+                raise ValueError(f"Cannot save {state['bit_generator']} generator state")
+            out.parts.append(state["state"]["state"].to_bytes(16, "little"))
+            out.parts.append(state["state"]["inc"].to_bytes(16, "little"))
+            out.pack("BI", state["has_uint32"], state["uinteger"])
+
+        out.values(self.player, self.PLAYER_FIELDS)
+        out.pack("I", len(self.companies))
+        for company in self.companies:
+            out.values(company, self.COMPANY_FIELDS)
+            out.mapping(company.influence)
+            out.mapping(company.workers)
+        out.pack("I", len(self.regions))
+        for region in self.regions.values():
+            out.values(region, self.SAVED_REGION_FIELDS)
+            out.mapping({name: count for name, count in region.workers.items() if count})
+
+        out.pack("QI", self.log.total, len(self.log))
+        for message in self.log.lines:
+            out.string(message)
+
+        # Orders placed since the last turn hold tea taken from their sellers
+        out.value(self.market is not None)
+        if self.market is not None:
+            out.pack("I", len(self.market))
+            for seller, region, quantity in self.market.orders():
+                out.pack("IId", seller, region, quantity)
+
+        out.value(self.history is not None)
+        if self.history is not None:
+            for table in self.history.values():
+                out.pack("II", table.first_turn, table.rows)
+                for column in table.columns.values():
+                    out.array(column)
+
+        header = SNAPSHOT_MAGIC + struct.pack("<H", SNAPSHOT_VERSION)
+        return header + zlib.compress(out.getvalue())
+
+    @classmethod
+    def from_bytes(cls, data, log_path=None):
+        """Rebuild a Simulation from to_bytes() output; it continues exactly where the saved one stopped."""
+        if data[:len(SNAPSHOT_MAGIC)] != SNAPSHOT_MAGIC:
+            raise ValueError("Not a Tea Empire save game")
+        (version,) = struct.unpack_from("<H", data, len(SNAPSHOT_MAGIC))
+        if not 1 <= version <= SNAPSHOT_VERSION:
+            raise ValueError(f"Unsupported save game version {version}")
+        reader = _SnapshotReader(zlib.decompress(data[len(SNAPSHOT_MAGIC) + 2:]))
+
+        sim = cls.__new__(cls)
+        reader.values(sim, cls.SAVED_FIELDS)
+        vectorized = reader.value()
+        sim.economy_rng, sim.competitor_rng, sim.event_rng = random.Random(), random.Random(), random.Random()
+        for rng in (sim.economy_rng, sim.competitor_rng, sim.event_rng):
+            reader.random_state(rng)
+        numpy_state = None
+        if vectorized:
+            state = int.from_bytes(reader.data[reader.offset:reader.offset + 16], "little")
+            inc = int.from_bytes(reader.data[reader.offset + 16:reader.offset + 32], "little")
+            reader.offset += 32
+            has_uint32, uinteger = reader.unpack("BI")
+            numpy_state = {"bit_generator": "PCG64", "state": {"state": state, "inc": inc},
+                           "has_uint32": has_uint32, "uinteger": uinteger}
+
+        sim.player = Player()
+        reader.values(sim.player, cls.PLAYER_FIELDS)
+        (company_count,) = reader.unpack("I")
+        sim.companies = []
+        for _ in range(company_count):
+            company = Company.__new__(Company)
+            reader.values(company, cls.COMPANY_FIELDS)
+            company.influence = reader.mapping()
+            company.workers = reader.mapping()
+            sim.companies.append(company)
+
+        (region_count,) = reader.unpack("I")
+        if vectorized:
+            sim.economy = RegionEconomy(region_count)
+            sim.economy.rng.bit_generator.state = numpy_state
+        else:
+            sim.economy = None
+        sim.workforce = WorkerMatrix(region_count, [sim.player.name] + [company.name for company in sim.companies],
+                                     vectorized)
+        sim.regions = {}
+        for index in range(region_count):
+            if vectorized:
+                region = VectorRegion.__new__(VectorRegion)
+                region.economy = sim.economy
+                region.index = index
+            else:
+                region = Region.__new__(Region)
+            region.rng = sim.economy_rng
+            region.workforce = sim.workforce
+            region.column = index
+            reader.values(region, cls.SAVED_REGION_FIELDS)
+            for name, count in reader.mapping().items():
+                region.update_worker_count(name, count)
+            sim.regions[region.name] = region
+        # Regions are saved by name, the companies key their mappings by Region
+        for company in sim.companies:
+            company.influence = {sim.regions[name]: value for name, value in company.influence.items()}
+            company.workers = {sim.regions[name]: value for name, value in company.workers.items()}
+
+        sim.log = GameLog(history_path=log_path)
+        total, count = reader.unpack("QI")
+        for _ in range(count):
+            sim.log.lines.append(reader.string())
+        sim.log.total = total
+
+        sim.market = None
+        if version >= 2 and reader.value():
+            sim.market = sim.make_market()
+            (order_count,) = reader.unpack("I")
+            for _ in range(order_count):
+                sim.market.submit(*reader.unpack("IId"))
+
+        # Saves from before the history was kept start theirs at the saved turn
+        sim.history = None
+        if version < 3:
+            sim.start_history()
+        elif reader.value():
+            sim.history = sim.history_tables()
+            for table in sim.history.values():
+                table.first_turn, table.rows = reader.unpack("II")
+                for column in table.columns.values():
+                    reader.array(column, table.rows * len(table.entities))
+        sim.turn_timer = StageTimer("turn.")
+        return sim
+
+    def save(self, path):
+        data = self.to_bytes()
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)  # Never leave a half-written save behind
+
+    @classmethod
+    def load(cls, path, log_path=None):
+        with open(path, "rb") as f:
+            return cls.from_bytes(f.read(), log_path=log_path)
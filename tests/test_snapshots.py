@@ -0,0 +1,109 @@
+"""Regression tests for save game snapshots (Simulation.to_bytes/from_bytes)."""
+import struct
+import unittest
+import zlib
+
+import simulation
+from simulation import Region, Simulation
+
+TURNS = 12
+
+
+def play(sim, turns):
+    """Hire, buy and sell in the first regions every turn, so all of the state moves."""
+    names = list(sim.regions)[:3]
+    for _ in range(turns):
+        for name in names:
+            sim.hire_worker(name)
+            sim.buy_tea_leaves(name)
+            sim.sell_tea(name)
+        sim.next_turn()
+    # Orders placed after the last turn are part of the save
+    sim.sell_tea(names[0])
+
+
+def downgrade(data, version):
+    """A current save as an older version wrote it: v2 had no history section, v1 no market
+    section either. Only valid for saves without market clearing or history."""
+    payload = zlib.decompress(data[len(simulation.SNAPSHOT_MAGIC) + 2:])
+    assert payload.endswith(b"FF"), "save has a market or history section"
+    payload = payload[:len(payload) - (simulation.SNAPSHOT_VERSION - version)]
+    return simulation.SNAPSHOT_MAGIC + struct.pack("<H", version) + zlib.compress(payload)
+
+
+class SnapshotTest(unittest.TestCase):
+    OPTIONS = {}
+
+    def new_game(self, **options):
+        sim = Simulation(seed=7, **{**self.OPTIONS, **options})
+        play(sim, TURNS)
+        return sim
+
+    def assert_same_future(self, saved, loaded):
+        play(saved, TURNS)
+        play(loaded, TURNS)
+        self.assertEqual(loaded.to_bytes(), saved.to_bytes())
+
+    def test_round_trip(self):
+        sim = self.new_game()
+        data = sim.to_bytes()
+        loaded = Simulation.from_bytes(data)
+        self.assertEqual(loaded.to_bytes(), data)
+        self.assertEqual(list(loaded.log.lines), list(sim.log.lines))
+
+    def test_resume(self):
+        sim = self.new_game()
+        self.assert_same_future(sim, Simulation.from_bytes(sim.to_bytes()))
+
+    def test_company_mappings_keyed_by_loaded_regions(self):
+        sim = self.new_game()
+        for company in sim.companies:
+            company.add_influence(sim.regions[next(iter(sim.regions))], 1.0)
+        loaded = Simulation.from_bytes(sim.to_bytes())
+        for company in loaded.companies:
+            self.assertTrue(company.influence)
+            for mapping in (company.influence, company.workers):
+                for region in mapping:
+                    self.assertIsInstance(region, Region)
+                    self.assertIs(loaded.regions[region.name], region)
+
+    def test_history(self):
+        sim = self.new_game()
+        loaded = Simulation.from_bytes(sim.to_bytes())
+        for name, table in sim.history.items():
+            self.assertEqual(loaded.history[name].first_turn, table.first_turn)
+            self.assertEqual(loaded.history[name].rows, table.rows)
+            self.assertEqual(loaded.history[name].columns, table.columns)
+
+    def test_older_versions(self):
+        sim = self.new_game(history=False, market_clearing=False)
+        data = sim.to_bytes()
+        for version in range(1, simulation.SNAPSHOT_VERSION):
+            with self.subTest(version=version):
+                loaded = Simulation.from_bytes(downgrade(data, version))
+                # Their history starts at the saved turn
+                self.assertEqual(loaded.history["agents"].first_turn, sim.turn_count)
+                self.assertEqual(loaded.history["agents"].rows, 1)
+                loaded.history = None
+                self.assertEqual(loaded.to_bytes(), data)
+                self.assert_same_future(Simulation.from_bytes(data), loaded)
+
+    def test_rejects_other_files(self):
+        with self.assertRaises(ValueError):
+            Simulation.from_bytes(b"PNG\x00" + bytes(16))
+        unsupported = simulation.SNAPSHOT_MAGIC + struct.pack("<H", simulation.SNAPSHOT_VERSION + 1)
+        with self.assertRaises(ValueError):
+            Simulation.from_bytes(unsupported + zlib.compress(b""))
+
+
+class MarketClearingSnapshotTest(SnapshotTest):
+    OPTIONS = {"market_clearing": True}
+
+
+@unittest.skipIf(simulation.np is None, "NumPy is not installed")
+class VectorizedSnapshotTest(SnapshotTest):
+    OPTIONS = {"vectorized": True, "market_clearing": True}
+
+
+if __name__ == "__main__":
+    unittest.main()